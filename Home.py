@@ -1,13 +1,8 @@
 import streamlit as st
-import pandas as pd
+from tableview import dataset_viewer
 
 st.set_page_config(page_title="Home", layout="wide")
 
-team_stats_df = pd.read_csv("./data/Cleaned_NBA_Per_Game_Stats_2015_2024.csv")
-regular_df = pd.read_csv("./data/Cleaned_NBA_Regular_Season_Games_2015_2024.csv")
-playoff_df = pd.read_csv("./data/Cleaned_NBA_Playoff_Games_2015_2024.csv")
-all_games_df = pd.read_csv("./data/Cleaned_NBA_All_Games_2015_2024.csv")
-
 st.header("Exploring NBA Statistics")
 
 st.markdown(
@@ -65,15 +60,15 @@ st.write("""
     The first dataset contains player data from 1425 players, every row containing a player, season, and average stats for that season.\n
 """)
 st.divider()
-st.dataframe(team_stats_df)
+dataset_viewer("player_stats", key="home_player_stats")
 
 st.write("The seconds dataset contains regular games from every team and every season, along with the same metrics as the player dataset.")
 st.divider()
-st.dataframe(regular_df)
+dataset_viewer("regular_games", key="home_regular_games")
 
 st.write("Our last dataset is the exact same as the previous, except it contains playoff games.")
 st.divider()
-st.dataframe(playoff_df)
+dataset_viewer("playoff_games", key="home_playoff_games")
 
 st.write("These last two datasets were combined into a larger games dataset containing every game for easier use.")
 
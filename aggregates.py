@@ -0,0 +1,103 @@
+# --- Team-season aggregate related functions ---
+import os
+import pandas as pd
+import streamlit as st
+from datastore import STORE_DIR, data_version, load_all_games, load_or_build
+
+TEAM_SEASON_KEYS = ["TEAM_NAME", "SEASON"]
+
+# Per game stats averaged for every team-season
+TEAM_SEASON_STATS = [
+    "PTS", "AST", "REB", "FG_PCT", "FG3_PCT",
+    "FT_PCT", "TOV", "FGA", "FG3A", "FTA",
+    "OREB", "DREB", "STL", "BLK", "PF",
+]
+
+# Percentages are missing for games without attempts, so their means keep their own game counts
+NULLABLE_STATS = ["FG_PCT", "FG3_PCT", "FT_PCT"]
+
+GAME_COLUMNS = tuple(TEAM_SEASON_KEYS + ["WL"] + TEAM_SEASON_STATS)
+
+TEAM_SEASON_PATH = os.path.join(STORE_DIR, "team_season.feather")
+
+
+def season_end_year(season: pd.Series) -> pd.Series:
+    """'2015-16' -> 2016"""
+    season = pd.Series(season)
+    return season.str[:4].astype(int) + 1
+
+
+def _summarise_games(games_df: pd.DataFrame) -> pd.DataFrame:
+    # Sums and counts per team-season, which can be added together when new games arrive.
+    # Stats are stored as small integers and float32, so they are summed as float64
+    summary = games_df[TEAM_SEASON_STATS].astype(float)
+    summary["GAMES"] = 1
+    summary["WINS"] = (games_df["WL"] == "W").astype(int)
+    for stat in NULLABLE_STATS:
+        summary[f"{stat}_GAMES"] = games_df[stat].notna().astype(int)
+    summary[TEAM_SEASON_KEYS] = games_df[TEAM_SEASON_KEYS]
+    return summary.groupby(TEAM_SEASON_KEYS, observed=True).sum(min_count=0)
+
+
+def _add_ranks(team_season: pd.DataFrame) -> pd.DataFrame:
+    team_season["LOSSES"] = team_season["GAMES"] - team_season["WINS"]
+    team_season["WIN_PCT"] = team_season["WINS"] / team_season["GAMES"]
+    team_season["TEAM_RANK"] = (team_season
+                                .groupby(level="SEASON", observed=True)["WINS"]
+                                .rank(ascending=False, method="dense")
+                                .astype(int))
+    return team_season
+
+
+def _to_means(sums: pd.DataFrame) -> pd.DataFrame:
+    team_season = sums.copy()
+    counts = ["GAMES", "WINS"] + [f"{stat}_GAMES" for stat in NULLABLE_STATS]
+    team_season[counts] = team_season[counts].astype(int)
+    for stat in TEAM_SEASON_STATS:
+        games = team_season[f"{stat}_GAMES"] if stat in NULLABLE_STATS else team_season["GAMES"]
+        team_season[stat] = team_season[stat] / games.where(games > 0)
+    return _add_ranks(team_season)
+
+
+def build_team_season(games_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    One row per (TEAM_NAME, SEASON) with per game means of TEAM_SEASON_STATS, games, wins, losses,
+    win percentage and TEAM_RANK (dense rank of wins within the season).
+    """
+    return _to_means(_summarise_games(games_df)).sort_index()
+
+
+def update_team_season(team_season: pd.DataFrame, new_games_df: pd.DataFrame) -> pd.DataFrame:
+    """Fold newly appended games into an existing table, recomputing only the team-seasons they touch."""
+    new_sums = _summarise_games(new_games_df)
+    touched = new_sums.index
+
+    # Turn the touched means back into sums so both sides can be added
+    old = team_season.reindex(touched)
+    old_sums = old[["GAMES", "WINS"] + [f"{stat}_GAMES" for stat in NULLABLE_STATS]].fillna(0)
+    for stat in TEAM_SEASON_STATS:
+        games = old_sums[f"{stat}_GAMES"] if stat in NULLABLE_STATS else old_sums["GAMES"]
+        old_sums[stat] = (old[stat] * games).fillna(0)
+    merged = _to_means(old_sums[new_sums.columns] + new_sums)
+
+    untouched = team_season.drop(touched, errors="ignore")
+    team_season = pd.concat([untouched, merged[team_season.columns]]).sort_index()
+
+    # Wins changed in the touched seasons, so their ranks are recomputed
+    seasons = touched.get_level_values("SEASON").unique()
+    in_seasons = team_season.index.get_level_values("SEASON").isin(seasons)
+    team_season.loc[in_seasons, "TEAM_RANK"] = (team_season[in_seasons]
+                                                .groupby(level="SEASON", observed=True)["WINS"]
+                                                .rank(ascending=False, method="dense")
+                                                .astype(int))
+    return team_season
+
+
+@st.cache_resource(show_spinner=False)
+def _load_team_season(version: str) -> pd.DataFrame:
+    return load_or_build(TEAM_SEASON_PATH, version, lambda: build_team_season(load_all_games(GAME_COLUMNS)))
+
+
+def load_team_season() -> pd.DataFrame:
+    """The team-season table over all games."""
+    return _load_team_season(data_version("all_games"))
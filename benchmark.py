@@ -0,0 +1,184 @@
+# --- Game outcome classifier benchmark related functions ---
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import streamlit as st
+from datastore import STORE_DIR, dataset_version, read_versioned_table, stored_version, write_versioned_table
+from features import load_game_features, model_data
+
+# Features of the home/away outcome models, as in the write-up's train_model
+OUTCOME_FEATURES = ["HOME", "PTS", "FG_PCT", "FG3_PCT", "FT_PCT", "REB", "AST", "STL", "BLK", "TOV"]
+
+CV_FOLDS = 5
+
+# Calls timed to measure the latency of predicting a single game
+SINGLE_PREDICTIONS = 20
+
+BENCHMARK_PATH = os.path.join(STORE_DIR, "classifier_benchmark.feather")
+
+
+def knn_classifier():
+    from sklearn.neighbors import KNeighborsClassifier
+    return KNeighborsClassifier()
+
+
+def random_forest_classifier():
+    from sklearn.ensemble import RandomForestClassifier
+    return RandomForestClassifier(random_state=42)
+
+
+def svc_classifier():
+    from sklearn.svm import SVC
+    return SVC()
+
+
+def gradient_boosting_classifier():
+    from sklearn.ensemble import GradientBoostingClassifier
+    return GradientBoostingClassifier(random_state=42)
+
+
+# The write-up's classifiers with their default parameters, each built by a function so worker processes can make them
+CLASSIFIERS = {
+    "KNN": knn_classifier,
+    "Random Forest": random_forest_classifier,
+    "SVC": svc_classifier,
+    "Gradient Boosting": gradient_boosting_classifier,
+}
+
+
+def outcome_training_data(features: pd.DataFrame) -> tuple:
+    """OUTCOME_FEATURES and WL of every regular season game of the feature store with all its features."""
+    X, y = model_data(features, OUTCOME_FEATURES, "WL", ["Regular Season"])
+    return X, y.astype(str)
+
+
+def _status_mb(field: str) -> float:
+    # Lines of /proc/self/status look like "VmHWM:     123456 kB"
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(f"{field}:"):
+                return int(line.split()[1]) / 2 ** 10
+    raise OSError(f"No {field} in /proc/self/status")
+
+
+def _reset_peak_rss() -> float:
+    """
+    Reset the process's peak resident memory to its current size where the OS allows it (Linux),
+    and return the size the peak is measured from.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return _status_mb("VmRSS")
+    except OSError:
+        return _peak_rss_mb()
+
+
+def _peak_rss_mb() -> float:
+    try:
+        return _status_mb("VmHWM")
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        # Windows has neither /proc nor resource, so peak memory is not measured there
+        return float("nan")
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def benchmark_fold(name: str, X: np.ndarray, y: np.ndarray, train: np.ndarray, test: np.ndarray) -> dict:
+    """
+    Fit one classifier on a fold's training games and score it on its test games. Peak memory is how far
+    the process's resident memory rose above what it held before fitting. Where the peak cannot be reset
+    it only counts growth past the process's earlier peak, so folds run in fresh processes.
+    """
+    classifier = CLASSIFIERS[name]()
+    baseline = _reset_peak_rss()
+
+    start = time.perf_counter()
+    classifier.fit(X[train], y[train])
+    fit_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    accuracy = (classifier.predict(X[test]) == y[test]).mean()
+    predict_s = time.perf_counter() - start
+
+    single = []
+    for row in test[:SINGLE_PREDICTIONS]:
+        start = time.perf_counter()
+        classifier.predict(X[row:row + 1])
+        single.append(time.perf_counter() - start)
+
+    return {
+        "Classifier": name, "ACCURACY": accuracy, "FIT_S": fit_s,
+        "PREDICT_US": predict_s / len(test) * 1e6, "SINGLE_PREDICT_MS": np.median(single) * 1e3,
+        "PEAK_MB": np.maximum(0.0, _peak_rss_mb() - baseline),
+    }
+
+
+def run_benchmark(features: pd.DataFrame, folds: int = CV_FOLDS, workers: int = None, seed: int = 42) -> pd.DataFrame:
+    """
+    Cross-validate every classifier of CLASSIFIERS on the regular season games of the feature store with stratified folds. Every (classifier, fold)
+    runs in its own worker process, at most workers (default: one per CPU) at a time so fits do not compete
+    for cores. Returns one row per classifier with the mean and standard deviation of the accuracy, the mean
+    fit time, the mean prediction time per game in a batch and for a single game, and the largest peak memory.
+    """
+    from sklearn.model_selection import StratifiedKFold
+
+    X, y = outcome_training_data(features)
+    splits = list(StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed).split(X, y))
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers, max_tasks_per_child=1) as pool:
+        runs = [pool.submit(benchmark_fold, name, X, y, train, test) for name in CLASSIFIERS for train, test in splits]
+        results = pd.DataFrame([run.result() for run in runs])
+
+    summary = results.groupby("Classifier", sort=False).agg(
+        ACCURACY=("ACCURACY", "mean"), ACCURACY_STD=("ACCURACY", "std"), FIT_S=("FIT_S", "mean"),
+        PREDICT_US=("PREDICT_US", "mean"), SINGLE_PREDICT_MS=("SINGLE_PREDICT_MS", "mean"), PEAK_MB=("PEAK_MB", "max"),
+    )
+    summary["FOLDS"] = folds
+    summary["GAMES"] = len(X)
+    return summary
+
+
+def build_benchmark_file(force: bool = False, workers: int = None) -> bool:
+    """Benchmark the classifiers on the regular season games unless the stored results are from the current games."""
+    version = dataset_version("regular_games")
+    if not force and stored_version(BENCHMARK_PATH) == version:
+        return False
+
+    write_versioned_table(run_benchmark(load_game_features(), workers=workers), BENCHMARK_PATH, version)
+    return True
+
+
+# Keyed by the file's modification time too, since a forced rerun keeps the data version
+@st.cache_resource(show_spinner=False)
+def _load_benchmark(version: str, mtime_ns: int) -> pd.DataFrame:
+    return read_versioned_table(BENCHMARK_PATH, version)
+
+
+def load_benchmark() -> tuple:
+    """
+    The stored benchmark results and whether they were computed from the current games,
+    (None, False) until python benchmark.py has been run. The page never runs the benchmark itself.
+    """
+    version = stored_version(BENCHMARK_PATH)
+    if version is None:
+        return None, False
+    return _load_benchmark(version, os.stat(BENCHMARK_PATH).st_mtime_ns), version == dataset_version("regular_games")
+
+
+if __name__ == "__main__":
+    # python benchmark.py [--force] [workers] cross-validates the outcome classifiers and stores the results
+    args = [arg for arg in sys.argv[1:] if arg != "--force"]
+    if build_benchmark_file(force="--force" in sys.argv, workers=int(args[0]) if args else None):
+        print(load_benchmark()[0].to_string())
+    else:
+        print(f"Benchmark results in {BENCHMARK_PATH} are up to date")
@@ -0,0 +1,86 @@
+# --- Player and team cluster related functions ---
+import numpy as np
+import pandas as pd
+from datastore import load_dataset, load_player_stats, write_source
+from metrics import exact_stats
+from query import query_games
+
+# Player stat behind each feature column of the per position cluster files, every position uses a few of them
+PLAYER_CLUSTER_STATS = {
+    "Average Total Rebounds": "TRB", "Average Total Blocks": "BLK", "Average Total Points": "PTS",
+    "Average Assists": "AST", "Average Steals": "STL", "Average Turnovers": "TOV",
+    "Two-Point Percentage Average": "2P%", "Three-Point Percentage Average": "3P%",
+}
+
+# Game stat behind each feature column of the team cluster file
+TEAM_CLUSTER_STATS = {
+    "Average Total Points": "PTS", "Average Field Goal Percentage": "FG_PCT",
+    "Average Free Throw Percentage": "FT_PCT", "Average Steals": "STL",
+    "Average Blocks": "BLK", "Average Turnovers": "TOV",
+}
+
+# Percentages are stored out of 100 in the cluster files
+PERCENT_FEATURES = [
+    "Two-Point Percentage Average", "Three-Point Percentage Average",
+    "Average Field Goal Percentage", "Average Free Throw Percentage",
+]
+
+
+def _feature_columns(clusters_df: pd.DataFrame, stats: dict) -> list:
+    return [column for column in clusters_df.columns if column in stats]
+
+
+def _averages(df: pd.DataFrame, key: str, features: list, stats: dict) -> pd.DataFrame:
+    columns = [stats[feature] for feature in features]
+    averages = exact_stats(df[[key] + columns]).groupby(key, sort=False, observed=True)[columns].mean()
+    averages.columns = features
+    percent = averages.columns.intersection(PERCENT_FEATURES)
+    averages[percent] *= 100
+    return averages.fillna(0).round(2)
+
+
+def assign_clusters(clusters_df: pd.DataFrame, features_df: pd.DataFrame, features: list) -> np.ndarray:
+    """
+    Label every row of features_df with the existing cluster whose centroid is nearest,
+    measured on the features standardized over the rows already clustered.
+    """
+    values = clusters_df[features].to_numpy(dtype=float)
+    mean, scale = values.mean(axis=0), values.std(axis=0)
+    scale[scale == 0] = 1.0
+
+    centroids = pd.DataFrame((values - mean) / scale).groupby(clusters_df["Cluster"].to_numpy()).mean()
+    points = (features_df[features].to_numpy(dtype=float) - mean) / scale
+    distances = ((points[:, None, :] - centroids.to_numpy()[None, :, :]) ** 2).sum(axis=2)
+    return centroids.index.to_numpy()[distances.argmin(axis=1)]
+
+
+def _update_clusters(name: str, key: str, averages: pd.DataFrame) -> pd.DataFrame:
+    clusters_df = load_dataset(name).drop(columns="Unnamed: 0")
+    averages = averages.rename_axis(key).reset_index()
+    averages["Cluster"] = assign_clusters(clusters_df, averages, list(averages.columns[1:]))
+
+    # The files are ordered by name, with an unnamed positional index column
+    kept = clusters_df[~clusters_df[key].isin(averages[key])]
+    frames = [frame for frame in (kept, averages[clusters_df.columns]) if len(frame)]
+    updated = pd.concat(frames).sort_values(key, ignore_index=True)
+    write_source(name, updated, index=True)
+    return updated
+
+
+def update_player_clusters(position: str, players: list) -> pd.DataFrame:
+    """Recompute the given players' averages at a position and assign them to the existing clusters."""
+    name = f"player_clusters_{position}"
+    features = _feature_columns(load_dataset(name), PLAYER_CLUSTER_STATS)
+
+    player_stats = load_player_stats()
+    seasons = player_stats[(player_stats["Pos"] == position) & player_stats["Player"].isin(players)]
+    return _update_clusters(name, "Player", _averages(seasons, "Player", features, PLAYER_CLUSTER_STATS))
+
+
+def update_team_clusters(teams: list) -> pd.DataFrame:
+    """Recompute the averages over every game of the given teams (abbreviations) and assign them to the existing clusters."""
+    features = _feature_columns(load_dataset("team_clusters"), TEAM_CLUSTER_STATS)
+
+    columns = ["TEAM_NAME"] + [TEAM_CLUSTER_STATS[feature] for feature in features]
+    games = query_games(columns, teams=list(teams)).to_pandas()
+    return _update_clusters("team_clusters", "Team Name", _averages(games, "TEAM_NAME", features, TEAM_CLUSTER_STATS))
@@ -0,0 +1,512 @@
+# --- Data loading related functions ---
+import contextlib
+import functools
+import hashlib
+import operator
+import os
+import shutil
+import time
+import uuid
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.feather as feather
+import streamlit as st
+from metrics import PlayerView, SeasonDeltas, build_player_index, build_player_view, build_season_deltas
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+STORE_DIR = os.path.join(DATA_DIR, "store")
+
+# Every dataset the app reads, keyed by the name pages ask for
+DATASETS = {
+    "player_stats": "Cleaned_NBA_Per_Game_Stats_2015_2024.csv",
+    "regular_games": "Cleaned_NBA_Regular_Season_Games_2015_2024.csv",
+    "playoff_games": "Cleaned_NBA_Playoff_Games_2015_2024.csv",
+    "player_clusters_C": "playerinfo_df_C.csv",
+    "player_clusters_PF": "playerinfo_df_PF.csv",
+    "player_clusters_PG": "playerinfo_df_PG.csv",
+    "player_clusters_SF": "playerinfo_df_SF.csv",
+    "player_clusters_SG": "playerinfo_df_SG.csv",
+    "team_clusters": "teaminfo_df_Grouped.csv",
+}
+
+# The all games table is stored once, built from the regular season and playoff sources in this order
+GAME_TYPES = {
+    "regular_games": "Regular Season",
+    "playoff_games": "Playoffs",
+}
+GAME_DATASETS = tuple(GAME_TYPES)
+
+# Games are stored in one directory per season and team, so a query for one team-season reads one file
+# and a new season only adds directories
+GAME_PARTITIONS = ["SEASON", "TEAM_ABBREVIATION"]
+
+# Stores are kept under a path with this number in it, bumped whenever the stored column types or layout
+# change so stores written in the old format are converted again rather than read
+STORE_FORMAT = 3
+
+# A partitioned store is a directory of versions and a CURRENT file naming the complete one to read.
+# Other versions are removed once they are this old, so readers that opened them have finished.
+CURRENT_FILE = "CURRENT"
+VERSION_TTL_S = 3600
+
+# Column types of the stored tables, applied once when the sources are parsed. Repeated strings are
+# categoricals, counts are the smallest integers that hold them with room to spare, and per game averages
+# and percentages, which have at most 3 decimals, are float32.
+PLAYER_STATS_DTYPES = {
+    "Rk": "int16", "Player": "category", "Age": "int8", "Pos": "category", "G": "int8", "GS": "int8",
+    **dict.fromkeys([
+        "MP", "FG", "FGA", "FG%", "3P", "3PA", "3P%", "2P", "2PA", "2P%", "eFG%", "FT", "FTA", "FT%",
+        "ORB", "DRB", "TRB", "AST", "STL", "BLK", "TOV", "PF", "PTS",
+    ], "float32"),
+    "Awards": "category", "Team": "category", "Season": "int16",
+}
+
+GAME_DTYPES = {
+    "SEASON_ID": "int32", "TEAM_ID": "int32", "TEAM_ABBREVIATION": "category", "TEAM_NAME": "category",
+    "GAME_ID": "int32", "MATCHUP": "category", "WL": "category",
+    **dict.fromkeys([
+        "MIN", "PTS", "FGM", "FGA", "FG3M", "FG3A", "FTM", "FTA",
+        "OREB", "DREB", "REB", "AST", "STL", "BLK", "TOV", "PF",
+    ], "int16"),
+    **dict.fromkeys(["FG_PCT", "FG3_PCT", "FT_PCT", "PLUS_MINUS"], "float32"),
+    "SEASON": "category", "Season": "category",
+}
+
+
+def dataset_path(name: str) -> str:
+    return os.path.join(DATA_DIR, DATASETS[name])
+
+
+def source_paths(name: str) -> list:
+    if name == "all_games":
+        return [dataset_path(source) for source in GAME_DATASETS]
+    return [dataset_path(name)]
+
+
+def store_path(name: str) -> str:
+    if name == "all_games":
+        return os.path.join(STORE_DIR, f"{name}-v{STORE_FORMAT}")
+    return os.path.join(STORE_DIR, f"{name}-v{STORE_FORMAT}.feather")
+
+
+def stored_datasets() -> list:
+    return ["all_games"] + [name for name in DATASETS if name not in GAME_DATASETS]
+
+
+def apply_dtypes(df: pd.DataFrame, dtypes: dict) -> pd.DataFrame:
+    """Cast columns to declared dtypes, raising for integers that do not fit rather than letting them wrap around."""
+    for column, dtype in dtypes.items():
+        if pd.api.types.is_integer_dtype(dtype) and len(df):
+            info = np.iinfo(dtype)
+            if df[column].min() < info.min or df[column].max() > info.max:
+                raise ValueError(f"{column} has values outside the range of {dtype}")
+    return df.astype(dtypes)
+
+
+def _read_csv(name: str) -> pd.DataFrame:
+    if name == "all_games":
+        return _read_all_games()
+
+    if name == "player_stats":
+        # Rk and Age are written as floats, so they are cast after parsing
+        return apply_dtypes(pd.read_csv(dataset_path(name)), PLAYER_STATS_DTYPES)
+
+    if name in GAME_DATASETS:
+        df = apply_dtypes(pd.read_csv(dataset_path(name)), GAME_DTYPES)
+        # GAME_DATE is stored as nanoseconds since the epoch
+        df["GAME_DATE"] = pd.to_datetime(df["GAME_DATE"], unit="ns")
+        return df
+
+    return pd.read_csv(dataset_path(name))
+
+
+def _read_all_games() -> pd.DataFrame:
+    frames = [_read_csv(name) for name in GAME_DATASETS]
+    # Categoricals with different categories are concatenated as strings, so they are cast again
+    games_df = pd.concat(frames, ignore_index=True).astype(GAME_DTYPES)
+
+    games_df["GAME_TYPE"] = pd.Categorical.from_codes(
+        np.repeat(np.arange(len(frames), dtype="int8"), [len(frame) for frame in frames]),
+        categories=list(GAME_TYPES.values())
+    )
+    return games_df
+
+
+@functools.lru_cache(maxsize=64)
+def _file_digest(path: str, mtime_ns: int, size: int) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def data_version(*names: str) -> str:
+    """Fingerprint of the source files behind the given datasets (all of them by default), used to key derived artifacts."""
+    paths = sorted({path for name in (names or stored_datasets()) for path in source_paths(name)})
+    digest = hashlib.sha256(str(STORE_FORMAT).encode())
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(_file_digest(path, stat.st_mtime_ns, stat.st_size).encode())
+    return digest.hexdigest()[:16]
+
+
+def is_store_fresh(name: str) -> bool:
+    # A partitioned store was last written when its CURRENT file was
+    path = os.path.join(store_path(name), CURRENT_FILE) if name == "all_games" else store_path(name)
+    if not os.path.exists(path):
+        return False
+    return all(os.path.getmtime(path) >= os.path.getmtime(source) for source in source_paths(name))
+
+
+def _write_game_partitions(games: pa.Table, path: str):
+    # Partitions holding any of the games are replaced, every other partition is left alone
+    ds.write_dataset(
+        games, path, format="feather", basename_template="part-{i}.feather",
+        partitioning=GAME_PARTITIONS, partitioning_flavor="hive", existing_data_behavior="delete_matching"
+    )
+
+
+def convert_dataset(name: str) -> str:
+    """Parse the source CSVs once and write them as uncompressed Feather files that can be memory-mapped."""
+    os.makedirs(STORE_DIR, exist_ok=True)
+    if name != "all_games":
+        return replace_file(store_path(name), lambda tmp_path: feather.write_feather(
+            _read_csv(name), tmp_path, compression="uncompressed"
+        ))
+
+    games = pa.Table.from_pandas(_read_csv(name), preserve_index=False)
+    return replace_dir(store_path(name), lambda version_dir: _write_game_partitions(games, version_dir))
+
+
+def replace_file(path: str, write) -> str:
+    """
+    Write a file with write(tmp_path) under a name no other writer uses, then move it over path,
+    so readers never see a half written file and concurrent writers never write to the same one.
+    """
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+    return path
+
+
+def current_dir(path: str) -> str:
+    """The version of a directory written with replace_dir that readers should use, None before there is one."""
+    try:
+        with open(os.path.join(path, CURRENT_FILE)) as f:
+            return os.path.join(path, f.readline().strip())
+    except OSError:
+        return None
+
+
+def replace_dir(path: str, write) -> str:
+    """
+    Write a new version of a directory with write(version_dir) and make it the current one, so the path
+    always holds a complete version and concurrent writers never write to the same one. Versions other
+    than the current one are removed once they are older than VERSION_TTL_S.
+    """
+    name = f"v-{uuid.uuid4().hex}"
+    version_dir = os.path.join(path, name)
+    os.makedirs(version_dir)
+    try:
+        write(version_dir)
+    except BaseException:
+        shutil.rmtree(version_dir, ignore_errors=True)
+        raise
+
+    def write_pointer(tmp_path: str):
+        with open(tmp_path, "w") as f:
+            f.write(name)
+
+    replace_file(os.path.join(path, CURRENT_FILE), write_pointer)
+
+    expired = time.time() - VERSION_TTL_S
+    current = {version_dir, current_dir(path)}
+    for entry in os.scandir(path):
+        if entry.is_dir() and entry.name.startswith("v-") and entry.path not in current and entry.stat().st_mtime < expired:
+            shutil.rmtree(entry.path, ignore_errors=True)
+    return path
+
+
+def store_games(games_df: pd.DataFrame):
+    """
+    Add games to the partitioned store. Only the season/team partitions they fall in are rewritten,
+    keeping the games already stored there, into a new version of the store that shares the files
+    of every other partition with the current one.
+    """
+    games = pa.Table.from_pandas(games_df, preserve_index=False)
+    current = current_dir(store_path("all_games"))
+    if current is None:
+        replace_dir(store_path("all_games"), lambda version_dir: _write_game_partitions(games, version_dir))
+        return
+
+    partitions = games_df[GAME_PARTITIONS].drop_duplicates().itertuples(index=False)
+    touched = functools.reduce(operator.or_, [
+        (ds.field("SEASON") == season) & (ds.field("TEAM_ABBREVIATION") == team) for season, team in partitions
+    ])
+    stored = _game_partitions()
+    # Read the partitions as stored, the sources may already hold these games and would be converted again
+    stored_games = stored.to_table(columns=games.schema.names, filter=touched)
+    # Feather files hold one dictionary per categorical column, so both sides are given a shared one.
+    # The new rows take the stored schema, whose dictionary indices are wide enough for both.
+    games = pa.concat_tables([stored_games, games.cast(stored_games.schema)]).unify_dictionaries()
+
+    def write(version_dir: str):
+        # Stored files are never changed in place, so the new version can link to them rather than copy them
+        for fragment in stored.get_fragments(filter=~touched):
+            target = os.path.join(version_dir, os.path.relpath(fragment.path, current))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            try:
+                os.link(fragment.path, target)
+            except OSError:
+                shutil.copyfile(fragment.path, target)
+        _write_game_partitions(games, version_dir)
+
+    # The new version's CURRENT file is written after the sources, so the store is as new as they are
+    replace_dir(store_path("all_games"), write)
+
+
+def append_source_rows(name: str, df: pd.DataFrame):
+    """Append cleaned rows to the end of a dataset's source CSV, in the file's column order."""
+    path = dataset_path(name)
+    rows = df.reindex(columns=pd.read_csv(path, nrows=0).columns)
+    if "GAME_DATE" in rows:
+        rows["GAME_DATE"] = rows["GAME_DATE"].astype("datetime64[ns]").astype("int64")
+    rows.to_csv(path, mode="a", header=False, index=False)
+
+
+def write_source(name: str, df: pd.DataFrame, index: bool = False):
+    """Replace a dataset's source CSV."""
+    replace_file(dataset_path(name), lambda tmp_path: df.to_csv(tmp_path, index=index))
+
+
+def build_store(force: bool = False) -> list:
+    converted = []
+    for name in stored_datasets():
+        if force or not is_store_fresh(name):
+            converted.append(convert_dataset(name))
+    return converted
+
+
+def read_table(name: str, columns: list = None) -> pa.Table:
+    """
+    The stored dataset as a memory-mapped Arrow table, so only the rows and columns used are read from disk.
+    Parsed from the source when the store cannot be written.
+    """
+    if not is_store_fresh(name):
+        try:
+            convert_dataset(name)
+        except OSError:
+            df = _read_csv(name)
+            return pa.Table.from_pandas(df[columns] if columns else df, preserve_index=False)
+
+    if name == "all_games":
+        return _read_game_partitions(columns)
+    return feather.read_table(store_path(name), columns=columns, memory_map=True)
+
+
+def _read_game_partitions(columns: list = None) -> pa.Table:
+    dataset = open_dataset("all_games")
+    # Partition columns come last in the dataset, the stored pandas metadata has the original order
+    columns = columns or [column["name"] for column in dataset.schema.pandas_metadata["columns"]]
+    games = dataset.to_table(columns=columns)
+    if "GAME_TYPE" not in columns:
+        return games
+
+    # Partitions are read season by season and team by team, so the game types are put back into
+    # the contiguous blocks the game type slices rely on
+    games = games.unify_dictionaries()
+    codes = games["GAME_TYPE"].combine_chunks().indices.to_numpy()
+    return games.take(np.argsort(codes, kind="stable"))
+
+
+def open_dataset(name: str) -> ds.Dataset:
+    """The stored dataset for scans that push column selection and row filters down to the file."""
+    if not is_store_fresh(name):
+        try:
+            convert_dataset(name)
+        except OSError:
+            return ds.dataset(read_table(name))
+
+    if name == "all_games":
+        return _game_partitions()
+    return ds.dataset(store_path(name), format="feather")
+
+
+def _game_partitions() -> ds.Dataset:
+    # Partition values are read back as categoricals, like the columns they were split from
+    partitioning = ds.HivePartitioning.discover(infer_dictionary=True)
+    return ds.dataset(current_dir(store_path("all_games")), format="feather", partitioning=partitioning)
+
+
+def read_dataset(name: str, columns: list = None) -> pd.DataFrame:
+    return read_table(name, columns).to_pandas()
+
+
+def write_versioned_table(df: pd.DataFrame, path: str, version: str) -> str:
+    """Write a derived table as Feather, stamped with the data version it was computed from."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table = pa.Table.from_pandas(df)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), b"data_version": version.encode()})
+
+    return replace_file(path, lambda tmp_path: feather.write_feather(table, tmp_path, compression="uncompressed"))
+
+
+def stored_version(path: str) -> str:
+    try:
+        metadata = feather.read_table(path, columns=[], memory_map=True).schema.metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return None
+    return metadata.get(b"data_version", b"").decode() or None
+
+
+def read_versioned_table(path: str, version: str) -> pd.DataFrame:
+    """A table written by write_versioned_table, or None when it is missing or was computed from other data."""
+    if stored_version(path) != version:
+        return None
+    return feather.read_table(path, memory_map=True).to_pandas()
+
+
+def load_or_build(path: str, version: str, build) -> pd.DataFrame:
+    """
+    The table stored for this data version, or the one build() returns, written for later runs.
+    Loaders cache derived data under the data version of its sources, so it is computed once per version.
+    Where the store cannot be written, as on read-only deployments, derived data is kept in memory only.
+    """
+    df = read_versioned_table(path, version)
+    if df is None:
+        df = build()
+        try:
+            write_versioned_table(df, path, version)
+        except OSError:
+            pass
+    return df
+
+
+def dataset_version(name: str) -> str:
+    """data_version of the stored dataset a name is read from, game types are read from all games."""
+    return data_version("all_games" if name in GAME_DATASETS else name)
+
+
+# Frames are shared by every session in the process, so callers must treat them as read-only
+# and take a .copy() before adding or overwriting columns.
+def load_dataset(name: str, columns: tuple = None) -> pd.DataFrame:
+    return _load_dataset(name, columns, dataset_version(name))
+
+
+@st.cache_resource(show_spinner=False)
+def _load_dataset(name: str, columns: tuple, version: str) -> pd.DataFrame:
+    if name in GAME_DATASETS:
+        return _load_game_type(name, columns)
+    return read_dataset(name, list(columns) if columns else None)
+
+
+def _load_game_type(name: str, columns: tuple = None) -> pd.DataFrame:
+    if columns and "GAME_TYPE" not in columns:
+        columns = tuple(columns) + ("GAME_TYPE",)
+    games_df = load_dataset("all_games", columns)
+
+    start, stop = _game_type_bounds(name, games_df["GAME_TYPE"].cat.codes.to_numpy())
+    return games_df.iloc[start:stop]
+
+
+def _game_type_bounds(name: str, codes: np.ndarray) -> tuple:
+    # Each game type is one contiguous block of the all games table, so a positional slice
+    # shares its memory instead of copying it
+    code = GAME_DATASETS.index(name)
+    start, stop = np.searchsorted(codes, [code, code + 1])
+    return int(start), int(stop)
+
+
+@st.cache_resource(show_spinner=False)
+def _load_table(name: str, version: str) -> pa.Table:
+    if name in GAME_DATASETS:
+        games = _load_table("all_games", version)
+        codes = games["GAME_TYPE"].combine_chunks().indices.to_numpy()
+        start, stop = _game_type_bounds(name, codes)
+        return games.slice(start, stop - start)
+    return read_table(name)
+
+
+def load_table(name: str) -> pa.Table:
+    """Arrow table of a dataset for readers that only need a few rows of it at a time, e.g. paginated views."""
+    return _load_table(name, dataset_version(name))
+
+
+def load_player_stats(columns: tuple = None) -> pd.DataFrame:
+    return load_dataset("player_stats", columns)
+
+
+def load_player_index() -> pd.DataFrame:
+    return _load_player_index(data_version("player_stats"))
+
+
+@st.cache_resource(show_spinner=False)
+def _load_player_index(version: str) -> pd.DataFrame:
+    return build_player_index(load_player_stats())
+
+
+def load_season_deltas() -> SeasonDeltas:
+    """Every player's season over season changes, see metrics.build_season_deltas."""
+    return _load_season_deltas(data_version("player_stats"))
+
+
+@st.cache_resource(show_spinner=False)
+def _load_season_deltas(version: str) -> SeasonDeltas:
+    return build_season_deltas(load_player_index())
+
+
+def load_player_names() -> list:
+    """Every player in the player stats, sorted."""
+    return list(_load_player_rows(data_version("player_stats")))
+
+
+@st.cache_resource(show_spinner=False)
+def _load_player_rows(version: str) -> dict:
+    # Positions of each player's rows, so a player's view is read without scanning the league
+    rows = load_player_stats().groupby("Player", observed=True).indices
+    return dict(sorted(rows.items()))
+
+
+def load_player_view(player: str) -> PlayerView:
+    """One player's stats and metrics by season, see metrics.build_player_view. Raises KeyError for unknown players."""
+    return _load_player_view(player, data_version("player_stats"))
+
+
+@st.cache_resource(show_spinner=False, max_entries=256)
+def _load_player_view(player: str, version: str) -> PlayerView:
+    stats = load_player_stats().iloc[_load_player_rows(version)[player]]
+    player_index = load_player_index()
+    return build_player_view(stats, player_index.iloc[player_index.index.get_loc(player)].droplevel("Player"))
+
+
+def load_regular_games(columns: tuple = None) -> pd.DataFrame:
+    return load_dataset("regular_games", columns)
+
+
+def load_playoff_games(columns: tuple = None) -> pd.DataFrame:
+    return load_dataset("playoff_games", columns)
+
+
+def load_all_games(columns: tuple = None) -> pd.DataFrame:
+    return load_dataset("all_games", columns)
+
+
+def load_player_clusters(position: str) -> pd.DataFrame:
+    return load_dataset(f"player_clusters_{position}")
+
+
+def load_team_clusters() -> pd.DataFrame:
+    return load_dataset("team_clusters")
+
+
+if __name__ == "__main__":
+    # python datastore.py [--force] rebuilds every stale store file ahead of deployment
+    import sys
+
+    for path in build_store(force="--force" in sys.argv):
+        print(f"Wrote {path}")
@@ -0,0 +1,113 @@
+# --- Game feature store related functions ---
+import os
+import pandas as pd
+import streamlit as st
+from datastore import STORE_DIR, data_version, load_all_games, load_or_build, stored_version, write_versioned_table
+
+FEATURE_KEYS = ["GAME_ID", "TEAM_ID"]
+
+# Columns that place a row, kept as they are
+GAME_COLUMNS = ["GAME_DATE", "SEASON", "GAME_TYPE", "TEAM_ABBREVIATION", "TEAM_NAME", "MATCHUP", "WL"]
+
+# Box score stats of the game itself, for models of what happened in it
+BOX_SCORE_STATS = [
+    "MIN", "PTS", "FGM", "FGA", "FG_PCT", "FG3M", "FG3A", "FG3_PCT", "FTM", "FTA", "FT_PCT",
+    "OREB", "DREB", "REB", "AST", "STL", "BLK", "TOV", "PF", "PLUS_MINUS",
+]
+
+# Stats averaged over a team's earlier games in the season, for models of games before they are played
+FORM_STATS = ["WIN", "PTS", "FG_PCT", "FG3_PCT", "FT_PCT", "REB", "AST", "STL", "BLK", "TOV", "PLUS_MINUS"]
+ROLLING_WINDOWS = (5, 10)
+
+FEATURE_PATH = os.path.join(STORE_DIR, "game_features.feather")
+
+
+def form_columns() -> list:
+    """Names of the pre-game aggregates of a team, the opponent's have an OPP_ prefix."""
+    columns = [f"{stat}_ROLL{window}" for window in ROLLING_WINDOWS for stat in FORM_STATS]
+    return columns + [f"{stat}_SEASON_AVG" for stat in FORM_STATS] + ["GAMES_PLAYED", "REST_DAYS", "BACK_TO_BACK"]
+
+
+def _team_form(games: pd.DataFrame) -> pd.DataFrame:
+    # games are sorted by team, season and date. Every aggregate is over the games before the row's,
+    # shifted by one game, which is as of its GAME_DATE since a team plays at most once a day
+    by_team = games.groupby(["TEAM_ID", "SEASON"], observed=True, sort=False)
+    earlier = by_team[FORM_STATS].shift(1)
+    by_team_earlier = earlier.groupby([games["TEAM_ID"], games["SEASON"]], observed=True, sort=False)
+
+    parts = [
+        by_team_earlier.rolling(window, min_periods=1).mean().droplevel([0, 1]).add_suffix(f"_ROLL{window}")
+        for window in ROLLING_WINDOWS
+    ]
+    parts.append(by_team_earlier.expanding().mean().droplevel([0, 1]).add_suffix("_SEASON_AVG"))
+    form = pd.concat(parts, axis=1).reindex(games.index).astype("float32")
+
+    form["GAMES_PLAYED"] = by_team.cumcount().astype("int16")
+    form["REST_DAYS"] = by_team["GAME_DATE"].diff().dt.days.astype("float32")
+    form["BACK_TO_BACK"] = (form["REST_DAYS"] == 1).astype("int8")
+    return form[form_columns()]
+
+
+def build_game_features(games: pd.DataFrame) -> pd.DataFrame:
+    """
+    One row per team per game, keyed by FEATURE_KEYS and in date order, with:
+    the game's GAME_COLUMNS and BOX_SCORE_STATS, binary HOME and WIN flags, the team's pre-game form
+    (rolling means over the last ROLLING_WINDOWS games and season to date means of FORM_STATS, games played,
+    rest days and back to back flag) and the same form of its opponent as OPP_ columns, with OPP_TEAM_ABBREVIATION.
+    Pre-game features only use games dated before the row's, so they can be used to predict it.
+    """
+    games = games[FEATURE_KEYS + GAME_COLUMNS + BOX_SCORE_STATS].copy()
+    games["HOME"] = games["MATCHUP"].astype(str).str.contains(" vs. ").astype("int8")
+    games["WIN"] = (games["WL"] == "W").astype("int8")
+    games = games.sort_values(["TEAM_ID", "SEASON", "GAME_DATE"], ignore_index=True)
+
+    features = pd.concat([games, _team_form(games)], axis=1)
+
+    # The other row of the same game is the opponent's, games stored for one team only have no opponent features
+    rows = features.index.to_series()
+    by_game = rows.groupby(features["GAME_ID"])
+    other = (by_game.transform("sum") - rows).where(by_game.transform("size") == 2, -1)
+    opponents = (features[["TEAM_ABBREVIATION"] + form_columns()]
+                 .reindex(other.to_numpy())
+                 .astype({"GAMES_PLAYED": "float32", "BACK_TO_BACK": "float32"}))
+    features = pd.concat([features, opponents.add_prefix("OPP_").set_axis(features.index)], axis=1)
+    return features.sort_values(["GAME_DATE"] + FEATURE_KEYS, ignore_index=True)
+
+
+def build_game_features_file(force: bool = False) -> bool:
+    version = data_version("all_games")
+    if not force and stored_version(FEATURE_PATH) == version:
+        return False
+
+    write_versioned_table(build_game_features(load_all_games()), FEATURE_PATH, version)
+    return True
+
+
+@st.cache_resource(show_spinner=False)
+def _load_game_features(version: str) -> pd.DataFrame:
+    return load_or_build(FEATURE_PATH, version, lambda: build_game_features(load_all_games()))
+
+
+def load_game_features() -> pd.DataFrame:
+    """The game feature store, shared by every game level model."""
+    return _load_game_features(data_version("all_games"))
+
+
+def model_data(features: pd.DataFrame, columns: list, target: str, game_types: list = None) -> tuple:
+    """
+    A model's inputs and target from the feature store: columns and target of the games of the given
+    types (e.g. ['Regular Season']), leaving out games missing any of them.
+    """
+    rows = features[features["GAME_TYPE"].isin(game_types)] if game_types else features
+    complete = rows[columns + [target]].notna().all(axis=1).to_numpy()
+    return rows[columns].to_numpy(dtype=float)[complete], rows[target].to_numpy()[complete]
+
+
+if __name__ == "__main__":
+    # python features.py [--force] materializes the game feature store
+    import sys
+
+    if build_game_features_file(force="--force" in sys.argv):
+        print(f"Built {FEATURE_PATH}")
+    else:
+        print(f"{FEATURE_PATH} is up to date")
@@ -0,0 +1,86 @@
+# --- Team points forecasting related functions ---
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+import streamlit as st
+from aggregates import load_team_season, season_end_year
+from datastore import data_version
+
+# Seasons in one cycle of the decomposition, also the rolling average window
+FORECAST_PERIOD = 3
+
+
+@dataclass
+class TeamForecasts:
+    components: pd.DataFrame    # indexed by (TEAM_NAME, season end year): AVG_PTS, RollingAvg, ChangeYOY, Trend, Seasonal, Resid
+    forecasts: pd.DataFrame     # indexed by TEAM_NAME: NEXT_SEASON, FORECAST_PTS
+
+
+def _decompose(series: pd.DataFrame) -> tuple:
+    from statsmodels.tsa.seasonal import seasonal_decompose
+
+    # A 2d array decomposes each column (team) as its own series in one call
+    result = seasonal_decompose(series.to_numpy(), model="additive", period=FORECAST_PERIOD)
+    return tuple(
+        pd.DataFrame(np.reshape(values, series.shape), index=series.index, columns=series.columns)
+        for values in (result.trend, result.seasonal, result.resid)
+    )
+
+
+def build_forecasts(team_season: pd.DataFrame) -> TeamForecasts:
+    """
+    Decompose every team's average points per season and forecast the next season as
+    the latest rolling average + the seasonal effect of the matching cycle position + the mean residual.
+    Teams with a season for every year are decomposed together in one call.
+    """
+    pts = team_season["PTS"].reset_index()
+    pts["YEAR"] = season_end_year(pts["SEASON"]).to_numpy()
+    pts = pts.pivot(index="YEAR", columns="TEAM_NAME", values="PTS").sort_index()
+
+    complete = pts.columns[pts.notna().all()]
+    decomposed = [_decompose(pts[complete])] if len(complete) else []
+    for team in pts.columns.difference(complete):
+        decomposed.append(_decompose(pts[[team]].dropna()))
+
+    trend, seasonal, resid = (pd.concat(parts, axis=1) for parts in zip(*decomposed))
+    rolling = pts.rolling(FORECAST_PERIOD, min_periods=1).mean()
+
+    components = pd.concat({
+        name: frame.unstack()
+        for name, frame in {
+            "AVG_PTS": pts,
+            "RollingAvg": rolling,
+            "ChangeYOY": pts.diff(),
+            "Trend": trend,
+            "Seasonal": seasonal,
+            "Resid": resid,
+        }.items()
+    }, axis=1).dropna(subset=["AVG_PTS"]).sort_index()
+
+    # Positional values per team, since teams may not share the same final season
+    by_team = components.groupby(level="TEAM_NAME", observed=True)
+    forecasts = pd.DataFrame({
+        "NEXT_SEASON": by_team.size().index.map(lambda team: components.loc[team].index.max() + 1),
+        "FORECAST_PTS": (by_team["RollingAvg"].agg(lambda values: values.iloc[-1])
+                         + by_team["Seasonal"].agg(lambda values: values.iloc[-FORECAST_PERIOD])
+                         + by_team["Resid"].mean()),
+    })
+    return TeamForecasts(components=components, forecasts=forecasts)
+
+
+@st.cache_resource(show_spinner="Forecasting...")
+def _load_forecasts(version: str) -> TeamForecasts:
+    return build_forecasts(load_team_season())
+
+
+def load_forecasts() -> TeamForecasts:
+    """Forecasts for every team."""
+    return _load_forecasts(data_version("all_games"))
+
+
+def team_forecast(forecasts: TeamForecasts, team: str) -> float:
+    return forecasts.forecasts.at[team, "FORECAST_PTS"]
+
+
+def team_components(forecasts: TeamForecasts, team: str) -> pd.DataFrame:
+    return forecasts.components.loc[team]
@@ -0,0 +1,72 @@
+# --- Import time report for the app's pages ---
+import ast
+import glob
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Slow to import libraries, which pages should only load in the sections that use them
+HEAVY_MODULES = ["sklearn", "statsmodels", "seaborn", "matplotlib", "altair", "joblib"]
+
+
+def page_paths() -> list:
+    return [os.path.join(ROOT, "Home.py")] + sorted(glob.glob(os.path.join(ROOT, "pages", "*.py")))
+
+
+def page_imports(path: str) -> list:
+    """Modules a page imports at the top level, i.e. before any of it renders."""
+    with open(path) as f:
+        tree = ast.parse(f.read())
+
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+
+def measure_imports(modules: list, skip: set = frozenset()) -> tuple:
+    """
+    Import the modules in a fresh interpreter and return the cumulative milliseconds of each
+    plus the heavy libraries that ended up loaded. Modules in skip are left out of the timings.
+    """
+    code = "".join(f"import {module}; " for module in modules)
+    code += f"import sys; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+        env={**os.environ, "PYTHONPATH": ROOT},
+    )
+
+    # Lines look like "import time:  self [us] | cumulative | imported package", nesting is indented
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name[1:].startswith(" ") and name.strip() not in skip:
+            timings[name.strip()] = int(cumulative) / 1000
+    loaded = [module for module in result.stdout.strip().split(",") if module]
+    return timings, loaded
+
+
+def report(paths: list) -> None:
+    # Modules the interpreter imports on its own before any page code runs
+    startup = set(measure_imports([])[0])
+
+    for path in paths:
+        timings, loaded = measure_imports(page_imports(path), startup)
+        slowest = sorted(timings.items(), key=lambda item: -item[1])[:5]
+
+        print(f"{os.path.relpath(path, ROOT)}: {sum(timings.values()):.0f} ms")
+        print("    slowest: " + ", ".join(f"{name} {ms:.0f} ms" for name, ms in slowest))
+        print("    heavy libraries at start-up: " + (", ".join(loaded) or "none"))
+
+
+if __name__ == "__main__":
+    # python import_report.py [page.py ...] times each page's top-level imports in a fresh interpreter
+    report([os.path.abspath(path) for path in sys.argv[1:]] or page_paths())
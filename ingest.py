@@ -0,0 +1,236 @@
+# --- Incremental ingestion of new games and player seasons ---
+import os
+from typing import Iterator
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from aggregates import TEAM_SEASON_PATH, load_team_season, update_team_season
+from clusters import update_player_clusters, update_team_clusters
+from datastore import (GAME_TYPES, append_source_rows, apply_dtypes, convert_dataset, data_version, dataset_path,
+                       load_dataset, open_dataset, replace_dir, replace_file, store_games, write_versioned_table)
+from metrics import POSITION_NAMES
+from models import build_model, load_model, save_model
+from query import query_games
+from similarity import (SIMILARITY_TABLE_PATH, extend_similarity_index, load_similarity_table,
+                        update_similarity_table)
+
+# Columns that identify a row, used to skip rows that were already ingested
+GAME_KEY = ["GAME_ID", "TEAM_ID"]
+PLAYER_KEY = ["Player", "Season", "Team"]
+
+# Raw files are read in chunks sized so the raw text, its cleaned copy and the stored rows it is
+# written next to all fit in the memory budget at once
+MEMORY_BUDGET_MB = 256
+CHUNK_COPIES = 3
+SAMPLE_ROWS = 1000
+
+
+def clean_rows(raw_df: pd.DataFrame, dtypes: pd.Series, key: list) -> pd.DataFrame:
+    """
+    Apply the cleaning steps from the wrangling write-up to raw rows and cast them to the stored dtypes:
+    repeated header rows are removed, GAME_DATE is parsed as a datetime (from a date string or the
+    sources' nanoseconds since the epoch) and every other column that is not text is converted to a number.
+    """
+    missing = dtypes.index.difference(raw_df.columns)
+    if len(missing):
+        raise ValueError(f"Raw rows are missing the columns {', '.join(missing)}")
+
+    df = raw_df[dtypes.index]
+    df = df[df[key[0]].astype(str) != key[0]].dropna(subset=key).copy()
+    for column, dtype in dtypes.items():
+        if column == "GAME_DATE":
+            # The sources store GAME_DATE as nanoseconds since the epoch, raw exports may use date strings
+            dates = df[column].dropna().astype(str)
+            if len(dates) and dates.str.fullmatch(r"-?\d+").all():
+                df[column] = pd.to_datetime(df[column].astype("int64"), unit="ns")
+            else:
+                df[column] = pd.to_datetime(df[column])
+        elif pd.api.types.is_numeric_dtype(dtype):
+            df[column] = pd.to_numeric(df[column], errors="coerce")
+
+    # Categoricals take the categories of the new rows, not those of the table they are added to
+    dtypes = {column: "category" if isinstance(dtype, pd.CategoricalDtype) else dtype for column, dtype in dtypes.items()}
+    return apply_dtypes(df, dtypes).drop_duplicates(key).reset_index(drop=True)
+
+
+def schema_dtypes(schema: pa.Schema) -> pd.Series:
+    """Column order and pandas dtypes of an Arrow schema, the fixed schema raw rows are cleaned to."""
+    return schema.empty_table().to_pandas().dtypes
+
+
+def chunk_rows(path: str, memory_budget_mb: int = MEMORY_BUDGET_MB) -> int:
+    """Rows of a raw CSV to read at a time, estimated from the size of its first rows once parsed."""
+    sample = pd.read_csv(path, dtype=str, nrows=SAMPLE_ROWS)
+    row_bytes = sample.memory_usage(deep=True).sum() / max(1, len(sample))
+    return max(1, int(memory_budget_mb * 2 ** 20 / (row_bytes * CHUNK_COPIES)))
+
+
+def clean_chunks(path: str, dtypes: pd.Series, key: list,
+                 memory_budget_mb: int = MEMORY_BUDGET_MB) -> Iterator[pd.DataFrame]:
+    """
+    Clean a raw CSV chunk by chunk with clean_rows, so files larger than memory can be cleaned.
+    Rows whose key was in an earlier chunk are dropped too, which keeps a 64 bit hash per row in memory.
+    """
+    seen = np.empty(0, dtype=np.uint64)
+    with pd.read_csv(path, dtype=str, chunksize=chunk_rows(path, memory_budget_mb)) as reader:
+        for raw_df in reader:
+            df = clean_rows(raw_df, dtypes, key)
+            hashes = pd.util.hash_pandas_object(df[key], index=False).to_numpy()
+            new = ~np.isin(hashes, seen, assume_unique=True)
+            seen = np.union1d(seen, hashes[new])
+            if new.any():
+                yield df[new].reset_index(drop=True)
+
+
+def stream_clean(path: str, out_path: str, schema: pa.Schema, key: list, partitioning: list = None,
+                 memory_budget_mb: int = MEMORY_BUDGET_MB) -> int:
+    """
+    Clean a raw CSV into the columnar store without holding more than a chunk of it in memory:
+    one Feather file, or a directory of Feather files partitioned by the given columns, written with
+    replace_dir and read from current_dir(out_path). Returns the number of rows written.
+    """
+    rows = 0
+    categories = {}
+
+    def batches():
+        nonlocal rows
+        for df in clean_chunks(path, schema_dtypes(schema), key, memory_budget_mb):
+            rows += len(df)
+            # A file holds one dictionary per categorical column, which later chunks may only add to,
+            # so every chunk's categories are those of the chunks before it followed by its new ones
+            for column in df.columns[df.dtypes == "category"]:
+                known = categories.get(column, pd.Index([], dtype=object))
+                categories[column] = known.append(df[column].cat.categories.difference(known))
+                df[column] = df[column].cat.set_categories(categories[column])
+            yield from pa.Table.from_pandas(df, schema=schema, preserve_index=False).to_batches()
+
+    def write_partitions(version_dir: str):
+        ds.write_dataset(batches(), version_dir, schema=schema, format="feather", basename_template="part-{i}.feather",
+                         partitioning=partitioning, partitioning_flavor="hive",
+                         file_options=ds.IpcFileFormat().make_write_options(emit_dictionary_deltas=True))
+
+    def write_file(tmp_path: str):
+        with pa.ipc.new_file(tmp_path, schema, options=pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)) as writer:
+            for batch in batches():
+                writer.write_batch(batch)
+
+    if partitioning:
+        replace_dir(out_path, write_partitions)
+    else:
+        replace_file(out_path, write_file)
+    return rows
+
+
+def _new_rows(df: pd.DataFrame, stored: pd.DataFrame, key: list) -> pd.DataFrame:
+    seen = pd.MultiIndex.from_frame(stored[key])
+    return df[~pd.MultiIndex.from_frame(df[key]).isin(seen)].reset_index(drop=True)
+
+
+def game_dtypes() -> pd.Series:
+    """Columns and dtypes raw games are cleaned to, those of the game store without the game type."""
+    return schema_dtypes(open_dataset("all_games").schema).drop("GAME_TYPE")
+
+
+def _add_games(games: pd.DataFrame, name: str, team_season: pd.DataFrame) -> tuple:
+    # Store the games that are not stored yet and fold them into the team-seasons
+    stored = query_games(GAME_KEY, seasons=games["SEASON"].unique().tolist(),
+                         teams=games["TEAM_ABBREVIATION"].unique().tolist()).to_pandas()
+    games = _new_rows(games, stored, GAME_KEY)
+    if games.empty:
+        return games, team_season
+
+    # The source only keeps the games once they are stored, so a failed store write leaves both as they were
+    source_size = os.path.getsize(dataset_path(name))
+    append_source_rows(name, games)
+    games["GAME_TYPE"] = pd.Categorical([GAME_TYPES[name]] * len(games), categories=list(GAME_TYPES.values()))
+    try:
+        store_games(games)
+    except Exception:
+        os.truncate(dataset_path(name), source_size)
+        raise
+    return games, update_team_season(team_season, games)
+
+
+def _ingest_game_chunks(chunks, name: str) -> int:
+    if name not in GAME_TYPES:
+        raise ValueError(f"Unknown game dataset '{name}', expected one of {tuple(GAME_TYPES)}")
+
+    # Aggregates as of the data before these games, which the updates add them to
+    team_season = load_team_season()
+    added, teams = 0, set()
+    try:
+        for games in chunks:
+            games, team_season = _add_games(games, name, team_season)
+            added += len(games)
+            teams.update(games["TEAM_ABBREVIATION"].unique())
+    finally:
+        # Chunks stored before a failure are kept, so their team-seasons and clusters are updated too
+        if added:
+            write_versioned_table(team_season, TEAM_SEASON_PATH, data_version("all_games"))
+            update_team_clusters(sorted(teams))
+    return added
+
+
+def ingest_games(raw_df: pd.DataFrame, name: str = "regular_games") -> int:
+    """
+    Clean and append raw games to a game dataset (regular_games or playoff_games), then update the
+    season/team partitions, team-seasons and team clusters they touch. Returns the number of games added.
+    """
+    return _ingest_game_chunks([clean_rows(raw_df, game_dtypes(), GAME_KEY)], name)
+
+
+def ingest_games_file(path: str, name: str = "regular_games", memory_budget_mb: int = MEMORY_BUDGET_MB) -> int:
+    """ingest_games for a raw CSV of any size, read, cleaned and stored one chunk at a time."""
+    return _ingest_game_chunks(clean_chunks(path, game_dtypes(), GAME_KEY, memory_budget_mb), name)
+
+
+def ingest_player_stats(raw_df: pd.DataFrame) -> int:
+    """
+    Clean and append raw player seasons, then update the similarity index and table for the players
+    they touch, retrain the player vs player model and reassign those players' clusters.
+    Returns the number of player seasons added.
+    """
+    player_stats = load_dataset("player_stats")
+    seasons = _new_rows(clean_rows(raw_df, player_stats.dtypes, PLAYER_KEY), player_stats, PLAYER_KEY)
+    if seasons.empty:
+        return 0
+
+    # Models as of the data before these seasons, which the updates add them to
+    similarity_index = load_model("similar_players")
+    similarity_table = load_similarity_table()
+
+    # As with games, the source only keeps the seasons once everything built from them is updated. Artifacts
+    # written before a failure are stamped with the data version of the appended rows and get rebuilt.
+    source_size = os.path.getsize(dataset_path("player_stats"))
+    append_source_rows("player_stats", seasons)
+    try:
+        convert_dataset("player_stats")
+
+        players = seasons["Player"].unique()
+        similarity_index = save_model("similar_players", extend_similarity_index(similarity_index, seasons))
+        write_versioned_table(update_similarity_table(similarity_table, similarity_index, players),
+                              SIMILARITY_TABLE_PATH, data_version("player_stats"))
+
+        # Pairs are sampled from every player season, so this model is retrained, which takes about a second
+        build_model("player_vs_player")
+
+        for position in seasons["Pos"].unique():
+            if position in POSITION_NAMES:
+                update_player_clusters(position, seasons.loc[seasons["Pos"] == position, "Player"].unique().tolist())
+    except Exception:
+        os.truncate(dataset_path("player_stats"), source_size)
+        raise
+    return len(seasons)
+
+
+if __name__ == "__main__":
+    # python ingest.py {regular_games|playoff_games|player_stats} new_rows.csv [memory_mb] appends and cleans new rows
+    import sys
+
+    name, path = sys.argv[1], sys.argv[2]
+    if name == "player_stats":
+        added = ingest_player_stats(pd.read_csv(path, dtype=str))
+    else:
+        added = ingest_games_file(path, name, int(sys.argv[3]) if len(sys.argv) > 3 else MEMORY_BUDGET_MB)
+    print(f"Added {added} rows to {name}")
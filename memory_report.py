@@ -0,0 +1,29 @@
+# --- Memory report for the stored tables ---
+import sys
+import pandas as pd
+from datastore import GAME_DATASETS, dataset_path, read_dataset, stored_datasets
+
+
+def frame_mb(df: pd.DataFrame) -> float:
+    return df.memory_usage(deep=True).sum() / 2 ** 20
+
+
+def default_mb(name: str) -> float:
+    """Memory of a dataset read from its source CSVs with pandas' default types, as pages used to load them."""
+    sources = GAME_DATASETS if name == "all_games" else [name]
+    return sum(frame_mb(pd.read_csv(dataset_path(source))) for source in sources)
+
+
+def report(names: list) -> None:
+    total_default = total_stored = 0.0
+    for name in names:
+        default, stored = default_mb(name), frame_mb(read_dataset(name))
+        total_default += default
+        total_stored += stored
+        print(f"{name}: {default:.2f} MB with default types, {stored:.2f} MB stored ({default / stored:.1f}x)")
+    print(f"total: {total_default:.2f} MB -> {total_stored:.2f} MB ({total_default / total_stored:.1f}x)")
+
+
+if __name__ == "__main__":
+    # python memory_report.py [dataset ...] compares each dataset's memory with and without the declared dtypes
+    report(sys.argv[1:] or stored_datasets())
@@ -1,66 +1,232 @@
 # --- Metric calculation related functions ---
+import re
+from dataclasses import dataclass
+import numpy as np
 import pandas as pd
 
+POSITION_NAMES = {
+    "PF": "Power Forward",
+    "SG": "Shooting Guard",
+    "SF": "Small Forward",
+    "C": "Center",
+    "PG": "Point Guard",
+}
+
 def abbreviation_to_position(abbr: str) -> str:
-    positions = {
-        "PF": "Power Forward",
-        "SG": "Shooting Guard",
-        "SF": "Small Forward",
-        "C": "Center",
-        "PG": "Point Guard",
-    }
-    return positions.get(abbr, abbr)
-
-def get_player_metrics(team_stats_df: pd.DataFrame, selected_player: str, season: str) -> dict:
-    player_season_df = team_stats_df.query("Player == @selected_player & Season == @season")
-
-    return {
-        "Team": player_season_df["Team"].iloc[0],
-        "Position": abbreviation_to_position(player_season_df["Pos"].iloc[0]),
-        "Age": round(player_season_df["Age"].apply(pd.to_numeric).iloc[0]),
-
-        "GamesPlayed": int(player_season_df["G"].iloc[0]),
-        "MinutesPlayed": round(float(player_season_df["MP"].iloc[0]), 1),
-
-        "FieldGoalsMade": round(float(player_season_df["FG"].iloc[0]), 1),
-        "FieldGoalsAttempted": round(float(player_season_df["FGA"].iloc[0]), 1),
-        "FieldGoalPercentage": round(float(player_season_df["FG%"].iloc[0]) * 100),
-
-        "ThreePointersMade": round(float(player_season_df["3P"].iloc[0]), 1),
-        "ThreePointersAttempted": round(float(player_season_df["3PA"].iloc[0]), 1),
-        "ThreePointersPercentage": round(float(player_season_df["3P%"].iloc[0]) * 100),
-
-        "FreeThrowsMade": round(float(player_season_df["FT"].iloc[0]), 1),
-        "FreeThrowsAttempted": round(float(player_season_df["FTA"].iloc[0]), 1),
-        "FreeThrowsPercentage": round(float(player_season_df["FT%"].iloc[0]) * 100),
-
-        "Assists": round(float(player_season_df["AST"].iloc[0]), 1),
-        "Steals": round(float(player_season_df["STL"].iloc[0]), 1),
-        "Blocks": round(float(player_season_df["BLK"].iloc[0]), 1)
-    }
-
-def feet_inches_to_cm(hgt: str) -> float:
-    try:
-        feet, inches = map(int, hgt.split("-"))
-        return round((feet * 12 + inches) * 2.54, 2)
-    except Exception:
-        return float(hgt)
-
-def pounds_to_kg(lbs: float) -> float:
-    return round(lbs / 2.205, 1)
-
-def calculate_percentage_change(old: float, new: float) -> str:
-    try:
-        return f"{round(((new - old) / old) * 100)}%"
-    except ZeroDivisionError:
-        return "0%"
-
-def calculate_metric_diffs(current: dict, previous: dict) -> dict:
-    diffs = {}
-    for key in current:
-        if key in previous:
-            try:
-                diffs[key] = round(current[key] - previous[key], 1)
-            except TypeError:
-                continue
-    return diffs
\ No newline at end of file
+    return POSITION_NAMES.get(abbr, abbr)
+
+# Stats are stored as float32, the sources hold them with at most this many decimals
+STAT_DECIMALS = 3
+
+def exact_stats(df: pd.DataFrame) -> pd.DataFrame:
+    """float32 columns as the float64 values of the sources, so sums, ties and rounding come out as they would from them."""
+    floats = df.columns[df.dtypes == "float32"]
+    return df.astype(dict.fromkeys(floats, "float64")).round(dict.fromkeys(floats, STAT_DECIMALS))
+
+# Per game stats exposed by get_player_metrics, keyed by their metrics dict name
+PER_GAME_METRICS = {
+    "MinutesPlayed": "MP",
+    "FieldGoalsMade": "FG", "FieldGoalsAttempted": "FGA",
+    "ThreePointersMade": "3P", "ThreePointersAttempted": "3PA",
+    "FreeThrowsMade": "FT", "FreeThrowsAttempted": "FTA",
+    "Assists": "AST", "Steals": "STL", "Blocks": "BLK",
+}
+
+# Percentage stats and the attempts column they are a rate of
+PERCENTAGE_METRICS = {
+    "FieldGoalPercentage": ("FG%", "FGA"),
+    "ThreePointersPercentage": ("3P%", "3PA"),
+    "FreeThrowsPercentage": ("FT%", "FTA"),
+}
+
+METRIC_ORDER = [
+    "Team", "Position", "Age", "GamesPlayed", "MinutesPlayed",
+    "FieldGoalsMade", "FieldGoalsAttempted", "FieldGoalPercentage",
+    "ThreePointersMade", "ThreePointersAttempted", "ThreePointersPercentage",
+    "FreeThrowsMade", "FreeThrowsAttempted", "FreeThrowsPercentage",
+    "Assists", "Steals", "Blocks",
+]
+
+# Metrics ranked by their change since a player's previous season, Age only ever goes up
+DELTA_METRICS = [metric for metric in METRIC_ORDER if metric not in ("Team", "Position", "Age")]
+
+def build_player_index(team_stats_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Build one row of get_player_metrics values per (Player, Season).
+    Players traded mid-season have a row per team, these are combined into season figures:
+    games are summed, per game stats and percentages are weighted by games played,
+    Team lists every team joined by "/" and Position comes from the team they played most games for.
+    """
+    keys = ["Player", "Season"]
+    team_stats_df = exact_stats(team_stats_df)
+    games = team_stats_df["G"].astype(int)
+
+    # Season totals so traded players can be combined with a single groupby
+    totals = pd.DataFrame({"Rows": 1, "GamesPlayed": games})
+    for metric, col in PER_GAME_METRICS.items():
+        totals[metric] = team_stats_df[col] * games
+    for metric, (col, attempts_col) in PERCENTAGE_METRICS.items():
+        # Attempts are rounded per game averages and can be 0.0 for a recorded percentage
+        weight = games * team_stats_df[attempts_col].clip(lower=0.05) * team_stats_df[col].notna()
+        totals[f"{metric}Made"] = team_stats_df[col].fillna(0) * weight
+        totals[f"{metric}Weight"] = weight
+    totals[keys] = team_stats_df[keys]
+    totals = totals.groupby(keys, sort=False, observed=True).sum()
+
+    # Single team seasons keep their own values, only traded players use the combined totals
+    primary_rows = (team_stats_df
+                    .sort_values("G", ascending=False, kind="stable")
+                    .drop_duplicates(keys)
+                    .set_index(keys)
+                    .reindex(totals.index))
+    traded = totals["Rows"] > 1
+
+    index = pd.DataFrame(index=totals.index)
+    index["Team"] = team_stats_df.groupby(keys, sort=False, observed=True)["Team"].agg("/".join)
+    index["Position"] = primary_rows["Pos"].map(abbreviation_to_position)
+    index["Age"] = primary_rows["Age"].round().astype(int)
+    index["GamesPlayed"] = totals["GamesPlayed"].astype(int)
+
+    for metric, col in PER_GAME_METRICS.items():
+        combined = totals[metric] / totals["GamesPlayed"]
+        index[metric] = combined.where(traded, primary_rows[col]).round(1)
+
+    # A season with no recorded percentage counts as 0%
+    for metric, (col, _) in PERCENTAGE_METRICS.items():
+        weight = totals[f"{metric}Weight"]
+        combined = totals[f"{metric}Made"] / weight.where(weight > 0)
+        rate = combined.where(traded, primary_rows[col]).fillna(0)
+        index[metric] = (rate * 100).round().astype(int)
+
+    return index[METRIC_ORDER].sort_index()
+
+def get_player_metrics(player_index: pd.DataFrame, selected_player: str, season: str) -> dict:
+    row = player_index.index.get_loc((selected_player, season))
+    return player_index.iloc[row].to_dict()
+
+@dataclass
+class PlayerView:
+    stats: pd.DataFrame    # the player's rows of the player stats table
+    seasons: list          # seasons played, latest first
+    metrics: dict          # season -> get_player_metrics values
+    diffs: dict            # season -> calculate_metric_diffs against the previous season played, if any
+
+def build_player_view(stats: pd.DataFrame, player_metrics: pd.DataFrame) -> PlayerView:
+    """Everything the Player Dashboard shows for one player, from their stats rows and player index rows by season."""
+    player_metrics = player_metrics.sort_index(ascending=False)
+    seasons = player_metrics.index.tolist()
+    previous = player_metrics.iloc[1:].set_axis(seasons[:-1])
+    return PlayerView(
+        stats=stats,
+        seasons=seasons,
+        metrics=player_metrics.to_dict("index"),
+        diffs=calculate_metric_diffs(player_metrics.iloc[:-1], previous).to_dict("index"),
+    )
+
+def _as_series(values) -> pd.Series:
+    return values if isinstance(values, pd.Series) else pd.Series(np.atleast_1d(values))
+
+def _like(values, result: pd.Series):
+    # A scalar gives a scalar and an array an array, Series keep their index
+    if isinstance(values, pd.Series):
+        return result
+    return result.iloc[0] if np.ndim(values) == 0 else result.to_numpy()
+
+def feet_inches_to_cm(hgt):
+    """'6-7' heights, or heights already in a number, to centimetres. Heights that cannot be read are NaN."""
+    heights = _as_series(hgt).astype(str)
+    parts = heights.str.split("-", n=1, expand=True).reindex(columns=[0, 1])
+    feet, inches = pd.to_numeric(parts[0], errors="coerce"), pd.to_numeric(parts[1], errors="coerce")
+    cm = ((feet * 12 + inches) * 2.54).round(2)
+    return _like(hgt, cm.where(parts[1].notna(), pd.to_numeric(heights, errors="coerce")))
+
+def pounds_to_kg(lbs):
+    return _like(lbs, (pd.to_numeric(_as_series(lbs), errors="coerce") / 2.205).round(1))
+
+def percentage_change(old, new):
+    """Change from old to new in percent, 0 where old is 0 or either value is missing."""
+    old_values = pd.to_numeric(_as_series(old), errors="coerce").to_numpy(dtype=float)
+    new_values = pd.to_numeric(_as_series(new), errors="coerce").to_numpy(dtype=float)
+    measurable = (old_values != 0) & ~np.isnan(old_values) & ~np.isnan(new_values)
+    change = np.divide((new_values - old_values) * 100, old_values, out=np.zeros(measurable.shape), where=measurable)
+
+    values = old if np.ndim(old) else new
+    return _like(values, pd.Series(change, index=values.index if isinstance(values, pd.Series) else None))
+
+def calculate_percentage_change(old, new):
+    change = percentage_change(old, new)
+    return _like(change, _as_series(change).round().astype(int).astype(str) + "%")
+
+def calculate_metric_diffs(current, previous):
+    """
+    current - previous for every numeric metric in both, rounded to 1 decimal.
+    Takes two metrics dicts, or two frames of metrics whose rows line up, e.g. a league table and each
+    row's previous season, which are compared in one pass.
+    """
+    if isinstance(current, dict):
+        diffs = calculate_metric_diffs(pd.DataFrame([current]), pd.DataFrame([previous]))
+        return diffs.to_dict("records")[0]
+
+    columns = current.columns.intersection(previous.columns, sort=False)
+    numeric = [col for col in columns
+               if pd.api.types.is_numeric_dtype(current[col]) and pd.api.types.is_numeric_dtype(previous[col])]
+    return (current[numeric] - previous[numeric]).round(1)
+
+def metric_label(metric: str) -> str:
+    """'ThreePointersMade' -> 'Three Pointers Made'"""
+    return re.sub(r"(?<!^)(?=[A-Z])", " ", metric)
+
+@dataclass
+class SeasonDeltas:
+    rows: pd.DataFrame      # Player, Season, PreviousSeason, Team, Position of every season after a player's first
+    values: pd.DataFrame    # DELTA_METRICS in that season, positionally aligned with rows
+    deltas: pd.DataFrame    # change of DELTA_METRICS since the player's previous season, aligned with rows
+    rankings: dict          # (metric, season, position) -> row positions, largest rise first, None matches any
+
+def build_season_deltas(player_index: pd.DataFrame) -> SeasonDeltas:
+    """
+    Every player's change in each metric from the previous season they played, with the rows ranked by change
+    for every metric, season and position up front so top_deltas only has to slice.
+    """
+    frame = player_index.reset_index()
+    previous = frame.groupby("Player", observed=True, sort=False).shift(1)
+    has_previous = previous["Season"].notna().to_numpy()
+
+    current = frame[has_previous].reset_index(drop=True)
+    previous = previous[has_previous].reset_index(drop=True)
+    values = current[DELTA_METRICS]
+    deltas = calculate_metric_diffs(values, previous[DELTA_METRICS]).astype(values.dtypes)
+
+    rows = current[["Player", "Season", "Team", "Position"]]
+    rows.insert(2, "PreviousSeason", previous["Season"].astype(current["Season"].dtype))
+
+    # Row masks of every season and position filter, None being no filter
+    seasons = {season: (rows["Season"] == season).to_numpy() for season in sorted(rows["Season"].unique().tolist())}
+    positions = {position: (rows["Position"] == position).to_numpy() for position in sorted(rows["Position"].dropna().unique())}
+    seasons[None] = positions[None] = np.ones(len(rows), dtype=bool)
+
+    rankings = {}
+    for metric in DELTA_METRICS:
+        change = deltas[metric].to_numpy(dtype=float)
+        order = np.argsort(-change, kind="stable")
+        order = order[~np.isnan(change[order])]
+        for season, in_season in seasons.items():
+            for position, in_position in positions.items():
+                rankings[metric, season, position] = order[(in_season & in_position)[order]]
+    return SeasonDeltas(rows=rows, values=values, deltas=deltas, rankings=rankings)
+
+def top_deltas(season_deltas: SeasonDeltas, metric: str, season: int = None, position: str = None,
+               k: int = 10, fallers: bool = False) -> pd.DataFrame:
+    """
+    The k player-seasons with the largest rise in a metric since the player's previous season, or the largest fall.
+    position is a full position name. Only the k rows returned are read, whatever the size of the league.
+    """
+    if metric not in DELTA_METRICS:
+        raise ValueError(f"Unknown metric '{metric}', expected one of {', '.join(DELTA_METRICS)}")
+
+    ranking = season_deltas.rankings.get((metric, season, position), np.empty(0, dtype=int))
+    top = ranking[::-1][:k] if fallers else ranking[:k]
+    result = season_deltas.rows.iloc[top].reset_index(drop=True)
+    result[metric] = season_deltas.values[metric].to_numpy()[top]
+    result["Change"] = season_deltas.deltas[metric].to_numpy()[top]
+    return result
@@ -0,0 +1,154 @@
+# --- Model training and registry related functions ---
+import os
+import numpy as np
+import pandas as pd
+import streamlit as st
+from datastore import data_version, read_dataset, replace_file
+from metrics import exact_stats
+from similarity import SimilarityIndex, build_similarity_index
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+
+# Bump when a training function changes so stored artifacts get rebuilt
+MODEL_VERSION = 4
+
+
+# Weights of the hand made score that decides the winner of a training pair
+WINNER_SCORE_WEIGHTS = {
+    "Age": 0.7, "TRB": 0.9, "STL": 0.9, "BLK": 0.9,
+    "FG%": -1.0, "3P%": 1.0, "FT%": 1.0,
+}
+
+# Pair features the player vs player model is trained on, each the difference of one stat
+PAIR_FEATURES = {
+    "age_diff": "Age", "reb_diff": "TRB", "blk_diff": "BLK",
+    "fg%_diff": "FG%", "3p%_diff": "3P%", "ft%_diff": "FT%",
+}
+
+PLAYER_PAIR_COUNT = 1000
+PLAYER_PAIR_SEED = 42
+
+
+def sample_pair_indices(n: int, pair_count: int, rng: np.random.Generator) -> tuple:
+    first = rng.integers(0, n, pair_count)
+    second = rng.integers(0, n - 1, pair_count)
+    second += second >= first  # never pair a row with itself
+
+    return np.minimum(first, second), np.maximum(first, second)
+
+def hypothetical_winner_labels(p1: np.ndarray, p2: np.ndarray, columns: list) -> np.ndarray:
+    """Label each pair 1 when the first player wins, ties go to the younger player."""
+    weights = np.array([WINNER_SCORE_WEIGHTS[col] for col in columns])
+    score1, score2 = p1 @ weights, p2 @ weights
+
+    age = columns.index("Age")
+    younger = (p1[:, age] < p2[:, age]).astype(int)
+    return np.where(score1 > score2, 1, np.where(score2 > score1, 0, younger))
+
+def make_player_pairs(team_stats_df: pd.DataFrame, pair_count: int = PLAYER_PAIR_COUNT, seed: int = PLAYER_PAIR_SEED) -> tuple:
+    """Sample random player pairs and return their feature differences and winner labels."""
+    columns = list(dict.fromkeys(list(WINNER_SCORE_WEIGHTS) + list(PAIR_FEATURES.values())))
+    values = exact_stats(team_stats_df[columns]).to_numpy(dtype=float)
+
+    i, j = sample_pair_indices(len(values), pair_count, np.random.default_rng(seed))
+    p1, p2 = values[i], values[j]
+
+    feature_idx = [columns.index(col) for col in PAIR_FEATURES.values()]
+    X = pd.DataFrame(p1[:, feature_idx] - p2[:, feature_idx], columns=list(PAIR_FEATURES))
+    y = pd.Series(hypothetical_winner_labels(p1, p2, columns))
+    return X, y
+
+def create_features(p1: pd.Series, p2: pd.Series) -> dict:
+    return {feature: p1[col] - p2[col] for feature, col in PAIR_FEATURES.items()}
+
+
+def train_player_vs_player():
+    from sklearn.ensemble import RandomForestClassifier
+
+    # The labels follow a fixed score, so the model is fit on every sampled pair
+    X, y = make_player_pairs(read_dataset("player_stats"), PLAYER_PAIR_COUNT, PLAYER_PAIR_SEED)
+    return RandomForestClassifier(random_state=42).fit(X, y)
+
+
+def train_similar_players() -> SimilarityIndex:
+    return build_similarity_index(read_dataset("player_stats"))
+
+
+# Each model with its training function and the datasets its fingerprint covers
+MODELS = {
+    "player_vs_player": (train_player_vs_player, ("player_stats",)),
+    "similar_players": (train_similar_players, ("player_stats",)),
+}
+
+
+def model_path(name: str) -> str:
+    return os.path.join(MODEL_DIR, f"{name}.joblib")
+
+
+def model_data_version(name: str) -> str:
+    return data_version(*MODELS[name][1])
+
+
+def _read_artifact(name: str) -> dict:
+    import joblib
+
+    try:
+        return joblib.load(model_path(name))
+    except (OSError, EOFError):
+        return {}
+
+
+def _is_current(artifact: dict, current_data_version: str) -> bool:
+    return artifact.get("version") == MODEL_VERSION and artifact.get("data_version") == current_data_version
+
+
+def is_model_fresh(name: str) -> bool:
+    return _is_current(_read_artifact(name), model_data_version(name))
+
+
+def save_model(name: str, model):
+    """Store a model as trained on the current data of its datasets, where the model directory can be written."""
+    import joblib
+
+    artifact = {"version": MODEL_VERSION, "data_version": model_data_version(name), "model": model}
+    try:
+        os.makedirs(MODEL_DIR, exist_ok=True)
+        replace_file(model_path(name), lambda tmp_path: joblib.dump(artifact, tmp_path))
+    except OSError:
+        pass
+    return model
+
+
+def build_model(name: str):
+    train, _ = MODELS[name]
+    return save_model(name, train())
+
+
+def build_models(force: bool = False) -> list:
+    built = []
+    for name in MODELS:
+        if force or not is_model_fresh(name):
+            build_model(name)
+            built.append(name)
+    return built
+
+
+@st.cache_resource(show_spinner="Loading model...")
+def _load_model(name: str, current_data_version: str):
+    artifact = _read_artifact(name)
+    if _is_current(artifact, current_data_version):
+        return artifact["model"]
+    return build_model(name)
+
+
+def load_model(name: str):
+    """Return a trained model, retraining it only when its source data or MODEL_VERSION has changed."""
+    return _load_model(name, model_data_version(name))
+
+
+if __name__ == "__main__":
+    # python models.py [--force] trains every stale model ahead of deployment
+    import sys
+
+    for name in build_models(force="--force" in sys.argv):
+        print(f"Trained {name} -> {model_path(name)}")
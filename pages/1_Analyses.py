@@ -1,17 +1,19 @@
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
-import matplotlib.pyplot as plt
-from statsmodels.tsa.seasonal import seasonal_decompose
-import seaborn as sns
+from datastore import load_player_clusters, load_team_clusters
+from aggregates import load_team_season
+from benchmark import load_benchmark
+from forecast import load_forecasts, team_components, team_forecast
+from performance import (PERFORMANCE_STATS, load_team_fits, load_team_performance, player_team_fits, team_averages,
+                         team_players)
 # from sklearn.ensemble import RandomForestRegressor
 # from sklearn.model_selection import train_test_split
 # from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 
-st.set_page_config(page_title="Analyses", page_icon="🔎", layout="wide")
+# Plotting libraries are imported in the sections that draw with them, so the page's text
+# renders before they load and reruns that skip a section never import its library
 
-team_stats_df = pd.read_csv("./data/Cleaned_NBA_Per_Game_Stats_2015_2024.csv")
-all_games_df = pd.read_csv("./data/Cleaned_NBA_All_Games_2015_2024.csv")
+st.set_page_config(page_title="Analyses", page_icon="🔎", layout="wide")
 
 
 st.header("Analyses")
@@ -84,20 +86,21 @@ st.code("""
         return pd.DataFrame(team_averages).set_index("Team")
 """)
 st.write("This function calculates the averages of the given metrics for every team and stores them in a dataframe.")
-st.dataframe(pd.DataFrame(data={
-    'FG%': [0.438814, 0.454188, 0.439247, 0.440115, 0.447876],
-    '3P%': [0.304016, 0.329192, 0.297453, 0.318241, 0.309920],
-    'FT%': [0.755054, 0.740247, 0.742995, 0.754721, 0.735717],
-    'AST': [1.786935, 1.830570, 2.001370, 1.996196, 1.838830],
-    'STL': [0.601005, 0.590155, 0.565753, 0.599457, 0.626596],
-    'BLK': [0.356784, 0.388083, 0.398630, 0.384239, 0.375532],
-    'TOV': [1.019095, 0.947150, 1.149772, 1.039130, 1.062234],
-    'PF': [1.602010, 1.516062, 1.687215, 1.585326, 1.636170],
-    'PTS': [8.071859, 8.081347, 8.598174, 8.616848, 8.583511]
-}, index=['ATL', 'BOS', 'BRK', 'CHO', 'CHI']))
+
+# Distances, z-scores and labels for every team and season
+performance = load_team_performance()
+performance_seasons = sorted(performance.averages.index.unique("Season"), reverse=True)
+performance_season = st.selectbox("Season:", performance_seasons, key="performance_season")
+st.dataframe(team_averages(performance, performance_season))
 
 st.markdown("##### Calculate average metrics for every player in chosen team")
-st.write("We are going to look at the Houston Rockets (HOU) as our team of choice.")
+st.write("We are going to look at the Houston Rockets (HOU) as our team of choice, though any team can be picked below.")
+performance_teams = sorted(team_averages(performance, performance_season).index)
+performance_team = st.selectbox(
+    "Team:", performance_teams, key="performance_team",
+    index=performance_teams.index("HOU") if "HOU" in performance_teams else 0
+)
+chosen_team_stats = team_players(performance, performance_team, performance_season)
 st.code("""
     def compute_team_averages(team) -> pd.DataFrame:
         example_team = team_rosters[team]
@@ -127,20 +130,9 @@ st.code("""
 st.write("""
     This function selects the chosen teams roster from the dataset, accumulates every players average metrics in that team, and stores it in ```houston_rockets_stats```.
 """)
-st.dataframe(pd.DataFrame(data={
-    'FG%': [0.421000, 0.378667, 0.521333, 0.287000, 0.342000, 0.415000, 0.660143, 0.361667, 0.426000, 0.435476],
-    '3P%': [0.383429, 0.334000, 0.292667, 0.230333, 0.326000, 0.325000, 0.000000, 0.219000, 0.340273, 0.295287],
-    'FT%': [0.856286, 0.813333, 0.706333, 0.812000, 0.731250, 0.770833, 0.615714, 0.610333, 0.764455, 0.727156],
-    'AST': [2.214286, 2.200000, 3.833333, 1.166667, 1.050000, 1.950000, 0.800000, 0.600000, 3.881818, 1.866285],
-    'STL': [0.628571, 0.600000, 0.966667, 0.266667, 0.425000, 0.483333, 0.428571, 0.400000, 1.472727, 0.657229],
-    'BLK': [0.171429, 0.133333, 0.833333, 0.166667, 0.200000, 0.116667, 0.557143, 0.466667, 0.390909, 0.363125],
-    'TOV': [0.957143, 1.100000, 2.400000, 0.566667, 0.575000, 0.983333, 1.071429, 0.400000, 2.418182, 1.092803],
-    'PF': [1.500000, 1.000000, 3.233333, 1.200000, 1.150000, 1.116667, 2.228571, 1.100000, 2.336364, 1.680199],
-    'PTS': [6.571429, 9.300000, 15.166667, 4.066667, 6.050000, 4.166667, 5.785714, 1.833333, 16.590909, 8.020594],
-    'GAME_COUNT': [7.0, 3.0, 3.0, 3.0, 4.0, 6.0, 7.0, 3.0, 11.0, 7.010204]
-}, index=[
-    "Aaron Holiday", "Alexey Shved", "Alperen Şengün", "Anthony Lamb", "Armoni Brooks",
-    "Tyler Ennis", "Tyson Chandler", "Usman Garuba", "Victor Oladipo", "Average"
+st.dataframe(pd.concat([
+    chosen_team_stats[PERFORMANCE_STATS + ["G"]].sort_index(),
+    team_averages(performance, performance_season).loc[[performance_team]].rename(index={performance_team: "Average"})
 ]))
 
 st.markdown("##### Calculate everyone's distance from the average")
@@ -202,14 +194,7 @@ st.code("""
     houston_rockets_stats[["Z_SCORE", "PERFORMANCE"]] = calculate_performance(houston_rockets_stats)
     houston_rockets_stats.iloc[:, -3:]
 """)
-st.dataframe(pd.DataFrame(data={
-    "DISTANCE_FROM_AVG": [20.078258, 15.926157, 13.211909, 11.794021, 10.883128, 1.041478, 0.878695, 0.772126, 0.711175],
-    "Z_SCORE": [4.890265, 3.612323, 2.776926, 2.340526, 2.060169, -0.968913, -1.019015, -1.051814, -1.070574],
-    "PERFORMANCE": ["Overperforming", "Overperforming", "Overperforming", "Overperforming", "Overperforming", "Average", "Underperforming", "Underperforming", "Underperforming"]
-}, index=[
-    "James Harden", "Russell Westbrook", "John Wall", "Jalen Green", "Chris Paul",
-    "Josh Smith", "KJ Martin", "Frank Kaminsky", "Austin Rivers"
-]))
+st.dataframe(chosen_team_stats[["DISTANCE_FROM_AVG", "Z_SCORE", "PERFORMANCE"]])
 st.write("Now we have successfully identified underperforming (and overperforming) player to some degree.")
 
 st.markdown("##### Suggest better suited teams with KNN Classifier")
@@ -230,49 +215,52 @@ st.code("""
         print("No underperforming players!")
 """)
 
+# Suggestions and what-if labels for every underperforming player
+fits = load_team_fits()
+flagged_players = chosen_team_stats.index[chosen_team_stats["PERFORMANCE"] == "Underperforming"].tolist()
+
 st.markdown("##### Visualising")
-values = [
-    0.11137566043893536,
-    0.10556061087271537,
-    0.10170136556722124,
-    0.10035136986417396,
-    0.10034025192877818,
-    0.09978468757119704,
-    0.09934822539312019,
-    0.09547419255625489,
-    0.0938480622885409,
-    0.0922155735190628
-]
-colors = [
-    "#b40426", "#da5948", "#f18e70", "#f7b89c", "#ead4c8",
-    "#ced9ec", "#aac7fd", "#83a6fb", "#5d7ce6", "#3b4cc0"
-]
-teams = ["MIA","NOP","DET","IND","BRK","MIN","LAC","HOU","PHO","CHO"]
-fig = go.Figure()
-cumulative = 0
-
-for i, (val, color, team) in enumerate(zip(values, colors, teams)):
-    fig.add_trace(go.Bar(
-        y=["Team"],
-        x=[val],
-        orientation='h',
-        base=[cumulative],
-        text=team,
-        textposition="inside",
-        marker=dict(color=color),
-        hoverinfo=None
-    ))
-    cumulative += val
-
-fig.update_layout(
-    barmode='stack',
-    height=250,
-    width=700,
-    showlegend=False,
-    xaxis=dict(showticklabels=False, showgrid=False, zeroline=False, title=''),
-    yaxis=dict(showticklabels=False, showgrid=False, zeroline=False, title='')
-)
-st.plotly_chart(fig)
+if not flagged_players:
+    st.info(f"{performance_team} had no underperforming players in {performance_season}!")
+else:
+    fit_player = st.selectbox("Underperforming player:", flagged_players, key="fit_player")
+    player_fits = player_team_fits(fits, performance_team, performance_season, fit_player)
+
+    colors = [
+        "#b40426", "#da5948", "#f18e70", "#f7b89c", "#ead4c8",
+        "#ced9ec", "#aac7fd", "#83a6fb", "#5d7ce6", "#3b4cc0"
+    ]
+
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    cumulative = 0
+
+    for i, (val, color, team) in enumerate(zip(player_fits["FIT"], colors, player_fits["FIT_TEAM"])):
+        fig.add_trace(go.Bar(
+            y=["Team"],
+            x=[val],
+            orientation='h',
+            base=[cumulative],
+            text=team,
+            textposition="inside",
+            marker=dict(color=color),
+            hoverinfo=None
+        ))
+        cumulative += val
+
+    fig.update_layout(
+        barmode='stack',
+        height=250,
+        width=700,
+        showlegend=False,
+        xaxis=dict(showticklabels=False, showgrid=False, zeroline=False, title=''),
+        yaxis=dict(showticklabels=False, showgrid=False, zeroline=False, title='')
+    )
+    st.plotly_chart(fig)
+
+    st.write(f"How {fit_player} would be labelled on each suggested team's roster:")
+    st.dataframe(player_fits[["FIT_TEAM", "FIT", "DISTANCE_FROM_AVG", "Z_SCORE", "PERFORMANCE"]])
 
 st.write("""
     Austin Rivers has been labelled as an underperforming player this season, owing to his below-average shooting efficiency, with a field goal percentage of only 42.0%. 
@@ -324,38 +312,70 @@ st.code("""
     for name, clf in classifiers:
         train_model(clf)
 """)
-st.badge("KNN Accuracy: 71.0%", color="red")
+
+# Cross-validated results stored by benchmark.py, the page never trains the classifiers itself
+benchmark, benchmark_current = load_benchmark()
+if benchmark is None:
+    st.info("Run `python benchmark.py` to cross-validate the classifiers on the games data and show their results here.")
+elif not benchmark_current:
+    st.caption("These results were computed before the latest games were added, run `python benchmark.py` to refresh them.")
+
+
+def accuracy_badge(name: str):
+    if benchmark is not None:
+        accuracy = benchmark["ACCURACY"]
+        color = "green" if accuracy[name] == accuracy.max() else "red" if accuracy[name] == accuracy.min() else "orange"
+        st.badge(f"{name} Accuracy: {accuracy[name]:.1%}", color=color)
+
+
+accuracy_badge("KNN")
 st.write("""
     K-Nearest Neighbors (KNN) is a basic classification algorithm which makes predictions based on the similarity between data points. 
     KNN represents each game as a vector in multidimensional space; looking for the K most similar games using euclidean distance by default. 
     The algorithm then looks at what happened in the K most similar games and predicts the most frequent outcome as the outcome for the new game. 
     KNN is an all round safe bet when it comes to classifying numerical data, but may not be the best suited in every case. 
-    For this example, we achieved an accuracy of 71% which is decent and means its classifying correctly most of the time.
+    For this example, it classifies most games correctly, which is decent for such a simple model.
 """)
-st.badge("Random Forest Accuracy: 80.3%", color="green")
+accuracy_badge("Random Forest")
 st.write("""
     Random Forest is a powerful classifier that constructs several decision trees on several random subsets of the data and the features. 
     To predict, it takes all of the sub-trees and forms a prediction on the grounds of majority voting to provide a more precise and stable prediction than a single decision tree. 
     Random Forest is designed to reduce overfitting and improve generalization by combining the predictions of multiple decision trees trained on different subsets of the data. 
-    This has proved successful, as we have a much better accuracy of 80.3%, meaning it's classifying correctly four fifths of the time.
+    This has proved successful, with a much better accuracy than KNN.
 """)
-st.badge("SVC: 75.2%", color="orange")
+accuracy_badge("SVC")
 st.write("""
     Support Vector Classification (SVC) is an algorithm for machine learning which tries to separate the data into classes by learning the best boundary between them. 
     SVC tries to find not just the line that separates the classes, but the line as far as it can from the closest points in each set. 
     These are called support vectors, and are the defining points which make the line of separation. If the data cannot be divided neatly using a line, SVC can apply what's called a kernel function to transform the data so it can be divided. 
-    Once it's trained, the model uses the boundary to determine into what grouping a new item of data fits. With an accuracy of 75.2% it's proving to be a decent choice.
+    Once it's trained, the model uses the boundary to determine into what grouping a new item of data fits. Its accuracy makes it a decent choice.
 """)
-st.badge("Gradient Boosting Accuracy: 80.2%", color="orange")
+accuracy_badge("Gradient Boosting")
 st.write("""
     Gradient Boosting Classification is another ensemble ML process where it builds an efficient prediction model by aggregating multiple weak decision trees in an iterative process. 
     Each iteration entails trying to minimize the previous iterations' residual errors as much as possible. This process is performed by training the new learner on the errors of previous decision trees. 
     Gradient boosting works well for many classification problems and can be adjusted to perform even better by choosing different ways to measure errors (loss functions) and by using techniques that help prevent the model from becoming too complicated. 
-    This resulted in an accuracy of 80.2%.
+    This resulted in an accuracy on par with Random Forest.
     
     To summarise, each of the classifiers performed as anticipated and in line with the type and quality of the dataset. From the observed performance, each of the models was suited for the task and was capable of dealing with the information in a satisfactory manner. 
     Differences in performance did occur, but were primarily a result of the nature of each of the classifiers and how it operates on the patterns in the information.
 """)
+if benchmark is not None:
+    st.write(f"""
+        The accuracies above are the means of {benchmark["FOLDS"].iloc[0]}-fold cross-validation over {benchmark["GAMES"].iloc[0]:,} regular season games.
+        Beyond accuracy, the classifiers differ in how long they take to train, how quickly they predict and how much memory they need:
+    """)
+    st.dataframe(
+        benchmark[["ACCURACY", "ACCURACY_STD", "FIT_S", "PREDICT_US", "SINGLE_PREDICT_MS", "PEAK_MB"]],
+        column_config={
+            "ACCURACY": st.column_config.NumberColumn("Accuracy", format="percent"),
+            "ACCURACY_STD": st.column_config.NumberColumn("Accuracy std", format="percent"),
+            "FIT_S": st.column_config.NumberColumn("Fit time (s)", format="%.2f"),
+            "PREDICT_US": st.column_config.NumberColumn("Batch predict (µs/game)", format="%.1f"),
+            "SINGLE_PREDICT_MS": st.column_config.NumberColumn("Single game predict (ms)", format="%.2f"),
+            "PEAK_MB": st.column_config.NumberColumn("Peak memory (MB)", format="%.1f"),
+        }
+    )
 
 st.divider()
 st.divider()
@@ -459,56 +479,28 @@ There were several technical decisions I made during this process:
 If I had more time, I would have liked to tried more advanced models for more accurate, team-specific forecasting, and experiment with different seasonal periods based on autocorrelation plots.
 """)
 
-@st.cache_data
-def load_data(path="./data/Cleaned_NBA_All_Games_2015_2024.csv"):
-    df = pd.read_csv(path)
-    df["GAME_DATE"] = pd.to_datetime(df["GAME_DATE"])
-    return df
-
-regular_games = load_data()
-
-# Aggregate seasonal PPG by team
-team_season_stats = (
-    regular_games
-    .groupby([pd.Grouper(key="GAME_DATE", freq="Y"), "TEAM_NAME"])["PTS"]
-    .mean()
-    .reset_index()
-    .rename(columns={"GAME_DATE": "SEASON", "PTS": "AVG_PTS"})
-)
-
 # Time Series Forecast — select a team to see it in action
 st.header("Time Series Forecast")
-teams = sorted(team_season_stats["TEAM_NAME"].unique())
+teams = sorted(load_team_season().index.unique("TEAM_NAME"))
 selected_team = st.selectbox("Select Team:", [""] + teams)
 
 if selected_team:
-    # Filter down to the chosen team
-    df = team_season_stats.query("TEAM_NAME == @selected_team").copy()
-    df.set_index("SEASON", inplace=True)
-    df.index = pd.to_datetime(df.index)
-
-    # Compute a 3-year rolling average and year-over-year change
-    df["RollingAvg"] = df["AVG_PTS"].rolling(window=3, min_periods=1).mean()
-    df["ChangeYOY"] = df["AVG_PTS"].diff()
-
-    # Decompose the PPG series into trend, seasonal and residual components
-    ts = df["AVG_PTS"].copy()
-    ts.index = pd.date_range(start=df.index.min(), periods=len(ts), freq="Y")
-    decomp = seasonal_decompose(ts, model="additive", period=3)
-
-    # Build a simple next-season forecast
-    next_year = df.index.year.max() + 1
-    forecast = (
-        df["RollingAvg"].iloc[-1]
-        + decomp.seasonal.iloc[-3]
-        + decomp.resid.mean(skipna=True)
-    )
+    import matplotlib.pyplot as plt
+
+    forecasts = load_forecasts()
+
+    # Rolling average, year-over-year change and decomposition of the chosen team's PPG
+    df = team_components(forecasts, selected_team)
+
+    # Simple next-season forecast
+    next_year = forecasts.forecasts.at[selected_team, "NEXT_SEASON"]
+    forecast = team_forecast(forecasts, selected_team)
 
     # 1) Average Points Per Game
     st.subheader("Average Points Per Game")
     st.markdown("How a team's average PPG evolves each season.")
     fig1, ax1 = plt.subplots(figsize=(10, 4))
-    ax1.plot(df.index.year, df["AVG_PTS"], marker="o")
+    ax1.plot(df.index, df["AVG_PTS"], marker="o")
     ax1.set_title("Average PPG by Season")
     ax1.set_xlabel("Season")
     ax1.set_ylabel("Avg PPG")
@@ -519,7 +511,7 @@ if selected_team:
     st.subheader("Year-over-Year Change")
     st.markdown("Season-to-season delta in a team's average PPG.")
     fig2, ax2 = plt.subplots(figsize=(10, 4))
-    ax2.bar(df.index.year, df["ChangeYOY"], color="gray")
+    ax2.bar(df.index, df["ChangeYOY"], color="gray")
     ax2.set_title("Year-over-Year Change in PPG")
     ax2.set_xlabel("Season")
     ax2.set_ylabel("Δ Avg PPG")
@@ -529,8 +521,14 @@ if selected_team:
     # 3) Time Series Decomposition
     st.subheader("Time Series Decomposition")
     st.markdown("Trend, seasonal and residual components of the PPG series.")
-    fig3 = decomp.plot()
-    fig3.set_size_inches(10, 8)
+    fig3, axes3 = plt.subplots(4, 1, sharex=True, figsize=(10, 8))
+    components = {"AVG_PTS": "Observed", "Trend": "Trend", "Seasonal": "Seasonal"}
+    for ax, (component, label) in zip(axes3, components.items()):
+        ax.plot(df.index, df[component])
+        ax.set_ylabel(label)
+    axes3[3].scatter(df.index, df["Resid"])
+    axes3[3].axhline(0, color="gray")
+    axes3[3].set_ylabel("Residual")
     fig3.suptitle("Decomposition of Average PPG", y=1.02)
     st.pyplot(fig3)
 
@@ -538,7 +536,7 @@ if selected_team:
     st.subheader("Forecast for Next Season")
     st.markdown("Projection combining 3-yr trend, seasonal effect and residual.")
     fig4, ax4 = plt.subplots(figsize=(10, 4))
-    ax4.plot(df.index.year, df["RollingAvg"], marker="x", linestyle="--", label="3-Yr Rolling Avg")
+    ax4.plot(df.index, df["RollingAvg"], marker="x", linestyle="--", label="3-Yr Rolling Avg")
     ax4.scatter([next_year], [forecast], color="red", s=100, label="Forecast")
     ax4.set_title("Rolling Average & Next Season Forecast")
     ax4.set_xlabel("Season")
@@ -574,18 +572,16 @@ st.subheader("Player Cluster Viewer by Position")
 
 position = st.selectbox("Select a Position", ["Shooting Guard", "Power Forward", "Point Guard", "Center", "Small Forward"])
 
-file_map = {
-    "Shooting Guard": "./data/playerinfo_df_SG.csv",
-    "Power Forward": "./data/playerinfo_df_PF.csv",
-    "Point Guard": "./data/playerinfo_df_PG.csv",
-    "Center": "./data/playerinfo_df_C.csv",
-    "Small Forward": "./data/playerinfo_df_SF.csv"
+position_map = {
+    "Shooting Guard": "SG",
+    "Power Forward": "PF",
+    "Point Guard": "PG",
+    "Center": "C",
+    "Small Forward": "SF"
 }
 
-file_path = file_map[position]
-
 try:
-    df = pd.read_csv(file_path)
+    df = load_player_clusters(position_map[position])
 
     player_names = df["Player"].unique()
     selected_player = st.selectbox("Select a Player", player_names)
@@ -600,9 +596,12 @@ try:
     st.subheader(f"Overview of Cluster {cluster_id}")
     st.write(cluster_info.iloc[:,1:-1].describe()[1:])
 
-    st.subheader(f"Pairs Plot for Position {position}")
-    pair_grid = sns.pairplot(df[df.columns[1:]], diag_kind="kde", hue="Cluster")
-    st.pyplot(pair_grid.fig)
+    # seaborn is only imported, and the plot only drawn, while the section is expanded
+    with st.expander(f"Pairs Plot for Position {position}", key="player_pairs_plot", on_change="rerun") as section:
+        if section.open:
+            import seaborn as sns
+            pair_grid = sns.pairplot(df[df.columns[1:]], diag_kind="kde", hue="Cluster")
+            st.pyplot(pair_grid.fig)
 
     st.subheader("Selected Player Information")
     st.write(player_info.to_frame().T)
@@ -611,7 +610,7 @@ try:
     st.dataframe(cluster_mates.iloc[:,1:-1])
 
 except FileNotFoundError:
-    st.error(f"The file for {position}s was not found. Make sure '{file_path}' exists.")
+    st.error(f"The cluster data for {position}s was not found.")
 
 
 st.subheader("Can we cluster teams by their average game statistics/play performance?")
@@ -629,10 +628,8 @@ st.markdown("""
 
 st.subheader("Team Cluster Viewer")
 
-file_path2 = "./data/teaminfo_df_Grouped.csv"
-
 try:
-    df2 = pd.read_csv(file_path2)
+    df2 = load_team_clusters()
 
     team_names = df2["Team Name"].unique()
     selected_team = st.selectbox("Select a Team", team_names)
@@ -646,9 +643,11 @@ try:
     st.subheader(f"Overview of Cluster {cluster_id2}")
     st.write(cluster_info2.iloc[:,2:-1].describe()[1:])
 
-    st.subheader(f"Pairs Plot")
-    pair_grid2 = sns.pairplot(df2[df2.columns[2:]], diag_kind="kde", hue="Cluster")
-    st.pyplot(pair_grid2.fig)
+    with st.expander("Pairs Plot", key="team_pairs_plot", on_change="rerun") as section:
+        if section.open:
+            import seaborn as sns
+            pair_grid2 = sns.pairplot(df2[df2.columns[2:]], diag_kind="kde", hue="Cluster")
+            st.pyplot(pair_grid2.fig)
 
     st.subheader("Team Information")
     st.write(team_info.to_frame().T)
@@ -657,7 +656,7 @@ try:
     st.dataframe(cluster_mates2.iloc[:,1:-1])
 
 except FileNotFoundError:
-    st.error(f"The file for {position}s was not found. Make sure '{file_path}' exists.")
+    st.error("The team cluster data was not found.")
 
 st.divider()
 st.divider()
@@ -1,58 +1,44 @@
 import streamlit as st
 from metrics import *
-import pandas as pd
-import altair as alt
+from datastore import load_player_names, load_player_view
+from similarity import load_similarity_table, lookup_similar_players
 
 st.set_page_config(page_title="Player Dashboards", page_icon="👤")
 
 # Gather players
-team_stats_df = pd.read_csv("./data/Cleaned_NBA_Per_Game_Stats_2015_2024.csv")
+unique_players = load_player_names()
 
 st.write("# Player Dashboards")
 st.divider()
 
-# Get selected player by URL ID
+# Preselect the player named in the URL
 url_player_name = st.query_params.get("player", None)
-
-# Try to find player name with that ID
-preselect_player = None
-if url_player_name:
-    try:
-        matches = team_stats_df[team_stats_df["Player"] == url_player_name]
-        if not matches.empty:
-            preselect_player = matches["Player"].iloc[0]
-    except ValueError:
-        pass
-
-unique_players = team_stats_df["Player"].dropna().sort_values().unique().tolist()
-default_index = unique_players.index(preselect_player) if preselect_player in unique_players else 0
+default_index = unique_players.index(url_player_name) if url_player_name in unique_players else 0
 
 selected_player = st.selectbox(
     "Search for a player:",
     options=unique_players,
     index=default_index
 )
-st.query_params["player"] = team_stats_df.query("Player == @selected_player")["Player"].iloc[0]
+st.query_params["player"] = selected_player
 
 if selected_player:
+    # Every section below reads from the selected player's view, cached per player,
+    # so a rerun costs the same whatever the size of the league
+    view = load_player_view(selected_player)
+
     with st.container(border=True):
         # Season selector
-        seasons = team_stats_df[team_stats_df["Player"] == selected_player]["Season"].sort_values(ascending=False).unique().tolist()
+        seasons = view.seasons
         default_season = seasons[0] if len(seasons) > 0 else None
         selected_season = st.segmented_control("Season", options=seasons, default=default_season)
 
         try:
-            # Get current season metrics
-            selected_index = seasons.index(selected_season)
-            current_season_metrics = get_player_metrics(team_stats_df, selected_player, selected_season)
-
-            previous_season_metrics = {}
-            player_metric_diffs = {}
-
-            # Get previous season metrics
-            if selected_index + 1 < len(seasons):
-                previous_season_metrics = get_player_metrics(team_stats_df, selected_player, seasons[selected_index + 1])
-                player_metric_diffs = calculate_metric_diffs(current_season_metrics, previous_season_metrics)
+            # Get current season metrics, and their change since the previous season played
+            if selected_season not in view.metrics:
+                raise ValueError(f"{selected_player} did not play in {selected_season}")
+            current_season_metrics = view.metrics[selected_season]
+            player_metric_diffs = view.diffs.get(selected_season, {})
 
 
             # Basic Info
@@ -108,12 +94,12 @@ if selected_player:
             st.divider()
 
 
+            import altair as alt
+
             metrics_to_plot = ["FG%", "FT%", "3P%"]
-            team_stats_df[metrics_to_plot] = team_stats_df[metrics_to_plot].apply(pd.to_numeric, errors='coerce')
 
             # Calculate metric means per season
-            season_avg_df = (team_stats_df
-                             .query("Player == @selected_player")
+            season_avg_df = (view.stats
                              .groupby("Season")[metrics_to_plot]
                              .mean()
                              .reset_index())
@@ -135,7 +121,7 @@ if selected_player:
                 title="Shooting Percentages Over Seasons",
                 height=700
             )
-            st.altair_chart(chart, use_container_width=True)
+            st.altair_chart(chart, width="stretch")
             st.divider()
 
 
@@ -155,8 +141,7 @@ if selected_player:
 
 
         # Display raw data as table
-        players_display_df = (team_stats_df
-                     .query("Player == @selected_player")
+        players_display_df = (view.stats
                      .set_index("Season")
                      .sort_index(ascending=False))
 
@@ -173,4 +158,11 @@ if selected_player:
             "Free Throws Made", "Free Throws Attempted", "Free Throws Rate",
             "Assists", "Steals", "Blocks",
         ]]
-        st.dataframe(players_display_df)
\ No newline at end of file
+        st.dataframe(players_display_df)
+
+
+        # Similar players from the precomputed table
+        st.markdown("<h3>Similar Players</h3>", unsafe_allow_html=True)
+        similar_players_df = lookup_similar_players(load_similarity_table(), selected_player, k=5)
+        for col, similar_player in zip(st.columns(5), similar_players_df["SimilarPlayer"]):
+            col.link_button(similar_player, url=f"/Player_Dashboards?player={similar_player}", width="stretch")
@@ -1,26 +1,73 @@
 import streamlit as st
-import pandas as pd
 import os
+from datastore import DATA_DIR, DATASETS, GAME_TYPES, data_version, load_all_games, load_player_names, load_player_stats
+from query import query_games, query_players
+from tableview import dataset_viewer, table_viewer
 
 st.header("Our Datasets")
 
-# Path to the directory containing the data
-data_dir = "data"
-
 # Ensure the directory exists
-if not os.path.exists(data_dir):
-    st.error(f"The directory '{data_dir}' does not exist.")
+if not os.path.exists(DATA_DIR):
+    st.error(f"The directory '{DATA_DIR}' does not exist.")
 else:
-    # List only CSV files in the /data directory
-    csv_files = [file for file in os.listdir(data_dir) if file.endswith('.csv')]
-
-    if not csv_files:
-        st.write("No CSV files found in the /data directory.")
-    else:
-        for file in csv_files:
-            st.subheader(f"{file}")
-            try:
-                df = pd.read_csv(os.path.join(data_dir, file))
-                st.dataframe(df)
-            except Exception as e:
-                st.error(f"Could not read {file}: {e}")
+    with st.expander("Query games", key="data_query_games", on_change="rerun") as section:
+        if section.open:
+            teams_df = load_all_games(("TEAM_ABBREVIATION", "TEAM_NAME")).drop_duplicates("TEAM_ABBREVIATION")
+            team_names = dict(zip(teams_df["TEAM_ABBREVIATION"], teams_df["TEAM_NAME"]))
+            dates = load_all_games(("GAME_DATE",))["GAME_DATE"]
+
+            team_col, season_col = st.columns(2)
+            teams = team_col.multiselect(
+                "Teams", sorted(team_names, key=team_names.get), format_func=team_names.get, placeholder="All teams"
+            )
+            seasons = season_col.multiselect(
+                "Seasons", sorted(load_all_games(("SEASON",))["SEASON"].unique()), placeholder="All seasons"
+            )
+
+            date_col, wl_col, type_col = st.columns([2, 1, 1])
+            date_range = date_col.date_input(
+                "Dates", value=(), min_value=dates.min(), max_value=dates.max()
+            )
+            wl = wl_col.multiselect("Result", ["W", "L"], format_func={"W": "Win", "L": "Loss"}.get, placeholder="Any")
+            game_types = type_col.multiselect("Game type", list(GAME_TYPES.values()), placeholder="Any")
+
+            # Filters are pushed down to the stored games, so only matching rows are read
+            filters = {
+                "teams": teams, "seasons": seasons, "wl": wl, "game_types": game_types,
+                "start_date": date_range[0] if date_range else None,
+                "end_date": date_range[-1] if date_range else None,
+            }
+            games = query_games(**filters)
+            source = ("game_query", data_version("all_games"), repr(sorted(filters.items())))
+            table_viewer(games, key="game_query", source=source)
+
+    with st.expander("Query players", key="data_query_players", on_change="rerun") as section:
+        if section.open:
+            player_col, position_col = st.columns([3, 1])
+            players = player_col.multiselect("Players", load_player_names(), placeholder="All players")
+            positions = position_col.multiselect(
+                "Positions", sorted(load_player_stats(("Pos",))["Pos"].unique()), placeholder="All positions"
+            )
+
+            team_col, season_col = st.columns(2)
+            teams = team_col.multiselect(
+                "Teams", sorted(load_player_stats(("Team",))["Team"].unique()), placeholder="All teams"
+            )
+            seasons = season_col.multiselect(
+                "Seasons", sorted(load_player_stats(("Season",))["Season"].unique()), placeholder="All seasons"
+            )
+
+            # As with games, the filters are pushed down to the stored player stats
+            filters = {"players": players, "seasons": seasons, "teams": teams, "positions": positions}
+            player_seasons = query_players(**filters)
+            source = ("player_query", data_version("player_stats"), repr(sorted(filters.items())))
+            table_viewer(player_seasons, key="player_query", source=source)
+
+    # Sections rerun when toggled and a dataset is only read while its section is expanded
+    for name, file in DATASETS.items():
+        with st.expander(file, key=f"data_{name}", on_change="rerun") as section:
+            if section.open:
+                try:
+                    dataset_viewer(name, key=name)
+                except Exception as e:
+                    st.error(f"Could not read {file}: {e}")
@@ -0,0 +1,251 @@
+# --- Player vs team performance related functions ---
+import os
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+import streamlit as st
+from datastore import STORE_DIR, data_version, load_or_build, load_player_stats
+from metrics import exact_stats
+
+PERFORMANCE_KEYS = ["Team", "Season"]
+
+# Per game stats a player is compared to their team on
+PERFORMANCE_STATS = ["FG%", "3P%", "FT%", "AST", "STL", "BLK", "TOV", "PF", "PTS"]
+
+# Players with fewer games for a team in a season are left out of its average and labels
+MIN_GAMES = 3
+
+# Z-scores of the distance from the team average within ±1 standard deviation are average
+PERFORMANCE_BINS = [-np.inf, -1, 1, np.inf]
+PERFORMANCE_LABELS = ["Underperforming", "Average", "Overperforming"]
+
+# Teams suggested for every underperforming player, nearest team profile first
+TEAM_FIT_K = 10
+
+TEAM_PROFILE_PATH = os.path.join(STORE_DIR, "team_profiles.feather")
+
+
+@dataclass
+class TeamPerformance:
+    averages: pd.DataFrame    # indexed by (Team, Season): mean of PERFORMANCE_STATS over the team's players
+    players: pd.DataFrame     # indexed by (Team, Season, Player): PERFORMANCE_STATS, G, DISTANCE_FROM_AVG, Z_SCORE, PERFORMANCE
+
+
+@dataclass
+class RosterSimulation:
+    averages: pd.DataFrame    # indexed by (SCENARIO, Team, Season) for the teams moves touched: PERFORMANCE_STATS
+    players: pd.DataFrame     # indexed by (SCENARIO, Team, Season, Player): PERFORMANCE_STATS, PREVIOUS_PERFORMANCE,
+                              # DISTANCE_FROM_AVG, Z_SCORE, PERFORMANCE
+
+
+def _qualified_stats(player_stats: pd.DataFrame) -> pd.DataFrame:
+    stats = exact_stats(player_stats[PERFORMANCE_KEYS + ["Player", "G"] + PERFORMANCE_STATS])
+    return stats[stats["G"] >= MIN_GAMES].set_index(PERFORMANCE_KEYS + ["Player"]).sort_index()
+
+
+def _profiles(stats: pd.DataFrame) -> pd.DataFrame:
+    by_team = stats.groupby(level=PERFORMANCE_KEYS, observed=True)[PERFORMANCE_STATS]
+    counts = by_team.count().add_suffix("_PLAYERS")
+    return pd.concat([by_team.mean(), counts], axis=1)
+
+
+def build_team_profiles(player_stats: pd.DataFrame) -> pd.DataFrame:
+    """
+    One row per (Team, Season) with the average of PERFORMANCE_STATS over the team's players and,
+    as <stat>_PLAYERS, how many players each average is over, so a player can be added to it.
+    """
+    return _profiles(_qualified_stats(player_stats))
+
+
+def _distances(stats: pd.DataFrame, averages: np.ndarray) -> np.ndarray:
+    # Missing stats make the distance missing, as np.linalg.norm of the row would
+    return np.linalg.norm(stats[PERFORMANCE_STATS].to_numpy() - averages, axis=1)
+
+
+def _labels(z_scores: pd.Series) -> pd.Series:
+    return pd.cut(z_scores, bins=PERFORMANCE_BINS, labels=PERFORMANCE_LABELS)
+
+
+def build_team_performance(player_stats: pd.DataFrame) -> TeamPerformance:
+    """
+    Compare every player to their team in every season at once: the Euclidean distance of their
+    PERFORMANCE_STATS from the team average, its z-score among their teammates and a label from PERFORMANCE_BINS.
+    Players missing a stat, e.g. a percentage without attempts, count towards the average but have no distance.
+    """
+    stats = _qualified_stats(player_stats)
+    averages = _profiles(stats)[PERFORMANCE_STATS]
+
+    # Every player's row minus their team-season's average row, broadcast in one subtraction
+    distances = _distances(stats, averages.reindex(stats.index.droplevel("Player")).to_numpy())
+    players = stats.assign(DISTANCE_FROM_AVG=distances).dropna(subset=["DISTANCE_FROM_AVG"])
+
+    by_team = players.groupby(level=PERFORMANCE_KEYS, observed=True)["DISTANCE_FROM_AVG"]
+    players["Z_SCORE"] = (players["DISTANCE_FROM_AVG"] - by_team.transform("mean")) / by_team.transform("std")
+    players["PERFORMANCE"] = _labels(players["Z_SCORE"])
+    return TeamPerformance(averages=averages, players=players)
+
+
+@st.cache_resource(show_spinner=False)
+def _load_team_performance(version: str) -> TeamPerformance:
+    return build_team_performance(load_player_stats())
+
+
+def load_team_performance() -> TeamPerformance:
+    """Performance labels for every team and season."""
+    return _load_team_performance(data_version("player_stats"))
+
+
+def _nearest_teams(players: pd.DataFrame, profiles: pd.DataFrame, rostered: pd.MultiIndex, k: int) -> pd.DataFrame:
+    # Every player against every team profile of their season, as the KNN over team averages did,
+    # skipping the teams they already played for that season
+    pairs = players[PERFORMANCE_STATS].reset_index().merge(
+        profiles[PERFORMANCE_STATS].reset_index().rename(columns={"Team": "FIT_TEAM"}),
+        on="Season", suffixes=("", "_FIT")
+    )
+    pairs = pairs[~pd.MultiIndex.from_frame(pairs[["FIT_TEAM", "Season", "Player"]]).isin(rostered)]
+
+    fit_stats = [f"{stat}_FIT" for stat in PERFORMANCE_STATS]
+    pairs["FIT_DISTANCE"] = np.linalg.norm(pairs[PERFORMANCE_STATS].to_numpy() - pairs[fit_stats].to_numpy(), axis=1)
+    pairs = (pairs.drop(columns=fit_stats)
+             .dropna(subset=["FIT_DISTANCE"])
+             .sort_values(PERFORMANCE_KEYS + ["Player", "FIT_DISTANCE"], ignore_index=True))
+
+    by_player = pairs.groupby(PERFORMANCE_KEYS + ["Player"], observed=True)
+    pairs["RANK"] = by_player.cumcount() + 1
+    pairs = pairs[pairs["RANK"] <= k].reset_index(drop=True)
+
+    # Share of the inverse distances of the player's suggestions, nearer teams fit better
+    closeness = 1 / pairs["FIT_DISTANCE"].clip(lower=np.finfo(float).eps)
+    pairs["FIT"] = closeness / closeness.groupby([pairs[key] for key in PERFORMANCE_KEYS + ["Player"]],
+                                                 observed=True).transform("sum")
+    return pairs
+
+
+def _check_moves(moves: pd.DataFrame, performance: TeamPerformance, profiles: pd.DataFrame):
+    def unknown(columns):
+        return ~pd.MultiIndex.from_frame(moves[columns]).isin(performance.players.index)
+
+    unrated = moves[unknown(["FROM_TEAM", "Season", "Player"])]
+    if len(unrated):
+        raise ValueError("Only players with a performance label can be moved, not "
+                         + ", ".join(f"{row.Player} ({row.FROM_TEAM} {row.Season})" for row in unrated.itertuples()))
+    unknown_teams = moves[~pd.MultiIndex.from_frame(moves[["TO_TEAM", "Season"]]).isin(profiles.index)]
+    if len(unknown_teams):
+        raise ValueError("No team profile for "
+                         + ", ".join(f"{row.TO_TEAM} {row.Season}" for row in unknown_teams.itertuples()))
+    if (~unknown(["TO_TEAM", "Season", "Player"])).any():
+        raise ValueError("Players can only be moved to teams they did not play for that season")
+    if moves.duplicated(["SCENARIO", "Player", "Season"]).any():
+        raise ValueError("A player can only be moved once per scenario")
+
+
+def simulate_moves(performance: TeamPerformance, profiles: pd.DataFrame, moves: pd.DataFrame) -> RosterSimulation:
+    """
+    Relabel the rosters touched by hypothetical moves. moves has one row per player moved with Player, Season,
+    FROM_TEAM and TO_TEAM, and optionally SCENARIO: the moves of a scenario are made together, e.g. both sides
+    of a trade, and every scenario starts from the real rosters, so many trades can be tried in one call.
+    Team averages are updated from the profiles' running sums by the moved players' stats instead of being
+    recomputed over whole rosters; distances and z-scores are recomputed for the touched rosters only.
+    Raises ValueError for players without a label, teams without a profile or repeated moves.
+    """
+    keys = ["SCENARIO", "Team", "Season"]
+    counts = [f"{stat}_PLAYERS" for stat in PERFORMANCE_STATS]
+    moves = moves.reset_index(drop=True)
+    if "SCENARIO" not in moves:
+        moves["SCENARIO"] = 0
+    moves = moves.astype({"FROM_TEAM": str, "TO_TEAM": str})
+    _check_moves(moves, performance, profiles)
+
+    moved = performance.players.reindex(pd.MultiIndex.from_frame(moves[["FROM_TEAM", "Season", "Player"]]))
+    stats = moved[PERFORMANCE_STATS].to_numpy()
+    played = ~np.isnan(stats)
+    change = np.hstack([np.where(played, stats, 0), played])
+
+    # Each move takes the player's stats out of one team's sums and counts and into another's
+    changes = pd.concat([
+        pd.DataFrame(sign * change, columns=PERFORMANCE_STATS + counts).assign(
+            SCENARIO=moves["SCENARIO"], Team=moves[team], Season=moves["Season"])
+        for sign, team in [(-1, "FROM_TEAM"), (1, "TO_TEAM")]
+    ]).groupby(keys).sum()
+    team = profiles.reindex(changes.index.droplevel("SCENARIO"))
+    sums = team[PERFORMANCE_STATS].to_numpy() * team[counts].to_numpy() + changes[PERFORMANCE_STATS].to_numpy()
+    players = team[counts].to_numpy() + changes[counts].to_numpy()
+    averages = pd.DataFrame(sums / np.where(players > 0, players, np.nan),
+                            index=changes.index, columns=PERFORMANCE_STATS)
+
+    # The touched rosters: their rated players less those moved out, plus those moved in
+    current = (performance.players[PERFORMANCE_STATS + ["PERFORMANCE"]]
+               .rename(columns={"PERFORMANCE": "PREVIOUS_PERFORMANCE"}))
+    touched = current.index.droplevel("Player").isin(team.index)
+    stayed = averages.index.to_frame(index=False).merge(current[touched].reset_index().astype({"Team": str}),
+                                                        on=["Team", "Season"])
+    moved_out = pd.MultiIndex.from_frame(moves[["SCENARIO", "FROM_TEAM", "Season", "Player"]])
+    stayed = stayed[~pd.MultiIndex.from_frame(stayed[keys + ["Player"]]).isin(moved_out)]
+    arrived = pd.concat([moves[["SCENARIO", "TO_TEAM", "Season", "Player"]].rename(columns={"TO_TEAM": "Team"}),
+                         current.reindex(moved.index).reset_index(drop=True)], axis=1)
+    rosters = pd.concat([stayed, arrived]).set_index(keys + ["Player"]).sort_index()
+
+    distances = _distances(rosters, averages.reindex(rosters.index.droplevel("Player")).to_numpy())
+    rosters["DISTANCE_FROM_AVG"] = distances
+    by_team = rosters.groupby(level=keys)["DISTANCE_FROM_AVG"]
+    rosters["Z_SCORE"] = (distances - by_team.transform("mean")) / by_team.transform("std")
+    rosters["PERFORMANCE"] = _labels(rosters["Z_SCORE"])
+    return RosterSimulation(averages=averages, players=rosters)
+
+
+def team_fits(performance: TeamPerformance, profiles: pd.DataFrame, players: pd.DataFrame = None,
+              k: int = TEAM_FIT_K) -> pd.DataFrame:
+    """
+    The k teams whose profile in the same season is nearest to each player's stats, for every underperforming
+    player unless players (rows of performance.players) are given. Indexed by (Team, Season, Player) with
+    RANK, FIT_TEAM, FIT_DISTANCE, FIT (share of the inverse distances) and the DISTANCE_FROM_AVG, Z_SCORE and
+    PERFORMANCE the player would have with FIT_TEAM's roster.
+    """
+    if players is None:
+        players = performance.players[performance.players["PERFORMANCE"] == "Underperforming"]
+
+    pairs = _nearest_teams(players, profiles, performance.players.index, k)
+
+    # Every suggestion is its own scenario of the player moving to the suggested team
+    moves = pairs[["Player", "Season"]].assign(FROM_TEAM=pairs["Team"], TO_TEAM=pairs["FIT_TEAM"], SCENARIO=pairs.index)
+    simulation = simulate_moves(performance, profiles, moves)
+    labels = simulation.players.reindex(pd.MultiIndex.from_frame(moves[["SCENARIO", "TO_TEAM", "Season", "Player"]]))
+    fits = pd.concat([pairs, labels[["DISTANCE_FROM_AVG", "Z_SCORE", "PERFORMANCE"]].set_axis(pairs.index)], axis=1)
+    columns = ["RANK", "FIT_TEAM", "FIT_DISTANCE", "FIT", "DISTANCE_FROM_AVG", "Z_SCORE", "PERFORMANCE"]
+    return fits.set_index(PERFORMANCE_KEYS + ["Player"])[columns]
+
+
+@st.cache_resource(show_spinner=False)
+def _load_team_profiles(version: str) -> pd.DataFrame:
+    return load_or_build(TEAM_PROFILE_PATH, version, lambda: build_team_profiles(load_player_stats()))
+
+
+def load_team_profiles() -> pd.DataFrame:
+    """The team profile table, stored next to the datasets and rebuilt when the player data changes."""
+    return _load_team_profiles(data_version("player_stats"))
+
+
+@st.cache_resource(show_spinner=False)
+def _load_team_fits(version: str) -> pd.DataFrame:
+    return team_fits(load_team_performance(), load_team_profiles())
+
+
+def load_team_fits() -> pd.DataFrame:
+    """Suggested teams for every underperforming player."""
+    return _load_team_fits(data_version("player_stats"))
+
+
+def team_players(performance: TeamPerformance, team: str, season: int) -> pd.DataFrame:
+    """A team-season's players indexed by name, furthest from the team average first."""
+    return (performance.players.loc[(team, season)]
+            .sort_values("DISTANCE_FROM_AVG", ascending=False))
+
+
+def team_averages(performance: TeamPerformance, season: int) -> pd.DataFrame:
+    """Every team's average stats in a season, indexed by team."""
+    return performance.averages.xs(season, level="Season")
+
+
+def player_team_fits(fits: pd.DataFrame, team: str, season: int, player: str) -> pd.DataFrame:
+    """A player's suggested teams, best fit first."""
+    return fits.loc[(team, season, player)].set_index("RANK")
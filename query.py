@@ -0,0 +1,67 @@
+# --- Game and player query related functions ---
+import datetime
+import functools
+import operator
+import pyarrow as pa
+import pyarrow.compute as pc
+from datastore import open_dataset
+
+# Filter arguments of each query and the column they match against
+GAME_FILTERS = {
+    "teams": "TEAM_ABBREVIATION",
+    "seasons": "SEASON",
+    "wl": "WL",
+    "game_types": "GAME_TYPE",
+}
+
+PLAYER_FILTERS = {
+    "players": "Player",
+    "seasons": "Season",
+    "teams": "Team",
+    "positions": "Pos",
+}
+
+
+def _isin_conditions(fields: dict, values: dict) -> list:
+    # One isin per filter given, an empty or missing filter matches everything
+    return [pc.field(column).isin(list(values[arg])) for arg, column in fields.items() if values.get(arg)]
+
+
+def _all_of(conditions: list) -> pc.Expression:
+    return functools.reduce(operator.and_, conditions) if conditions else None
+
+
+def game_filter(teams: list = None, seasons: list = None, start_date: datetime.date = None,
+                end_date: datetime.date = None, wl: list = None, game_types: list = None) -> pc.Expression:
+    """
+    Filter expression over the all games table, None when nothing is filtered.
+    teams are abbreviations, seasons are strings like '2015-16' and the date range includes both ends.
+    """
+    filters = {"teams": teams, "seasons": seasons, "wl": wl, "game_types": game_types}
+    conditions = _isin_conditions(GAME_FILTERS, filters)
+    if start_date:
+        conditions.append(pc.field("GAME_DATE") >= start_date)
+    if end_date:
+        conditions.append(pc.field("GAME_DATE") < end_date + datetime.timedelta(days=1))
+    return _all_of(conditions)
+
+
+def query_games(columns: list = None, **filters) -> pa.Table:
+    """
+    Games matching the filters of game_filter, reading only the given columns.
+    Season and team filters skip whole partitions and the rest run while the files are scanned,
+    so rows that do not match are never materialized.
+    """
+    return open_dataset("all_games").to_table(columns=columns, filter=game_filter(**filters))
+
+
+def player_filter(players: list = None, seasons: list = None, teams: list = None,
+                  positions: list = None) -> pc.Expression:
+    """Filter expression over the player stats table, None when nothing is filtered."""
+    filters = {"players": players, "seasons": seasons, "teams": teams, "positions": positions}
+    return _all_of(_isin_conditions(PLAYER_FILTERS, filters))
+
+
+def query_players(columns: list = None, **filters) -> pa.Table:
+    """Player seasons matching the filters of player_filter, reading only the given columns."""
+    return open_dataset("player_stats").to_table(columns=columns, filter=player_filter(**filters))
@@ -0,0 +1,367 @@
+# --- Player similarity search related functions ---
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+import streamlit as st
+from datastore import (STORE_DIR, data_version, load_or_build, read_dataset, stored_version,
+                       write_versioned_table)
+from metrics import exact_stats
+
+SIMILARITY_FEATURES = ["G", "GS", "MP", "FG", "FGA",
+                       "FG%", "3P", "3PA", "3P%", "FT",
+                       "FTA", "FT%", "ORB", "DRB", "TRB",
+                       "AST", "STL", "BLK", "TOV", "PF", "PTS"]
+
+# Columns kept alongside every embedding so results map back to the right player-season
+ROW_COLUMNS = ["Player", "Season", "Team", "Pos"]
+
+SEARCH_METHODS = ("tree", "exact", "quantized")
+
+# How many extra neighbours to fetch per requested player, since one player can match with several seasons
+OVERFETCH = 8
+
+SIMILARITY_TABLE_PATH = os.path.join(STORE_DIR, "similar_players.feather")
+SIMILARITY_TABLE_K = 10
+
+
+@dataclass
+class SimilarityIndex:
+    rows: pd.DataFrame          # ROW_COLUMNS for every embedding, positionally aligned
+    embeddings: np.ndarray      # standardized features, one row per player-season
+    mean: np.ndarray
+    scale: np.ndarray
+    tree: object                # sklearn KDTree over embeddings
+    codes: np.ndarray           # int8 quantized embeddings for approximate search
+    code_scale: np.ndarray
+    player_codes: np.ndarray    # factorized Player of every row, used to report each player once
+    player_rows: dict           # player name -> positions of their rows
+
+
+def _features(team_stats_df: pd.DataFrame) -> np.ndarray:
+    # A percentage with no attempts behind it counts as 0
+    features = exact_stats(team_stats_df[SIMILARITY_FEATURES]).to_numpy(dtype=float)
+    return np.nan_to_num(features, nan=0.0)
+
+
+def _make_index(rows: pd.DataFrame, embeddings: np.ndarray, mean: np.ndarray, scale: np.ndarray,
+                code_scale: np.ndarray) -> SimilarityIndex:
+    from sklearn.neighbors import KDTree
+
+    player_codes, _ = pd.factorize(rows["Player"])
+    return SimilarityIndex(
+        rows=rows,
+        embeddings=embeddings,
+        mean=mean,
+        scale=scale,
+        tree=KDTree(embeddings),
+        codes=np.round(embeddings / code_scale).clip(-127, 127).astype(np.int8),
+        code_scale=code_scale,
+        player_codes=player_codes,
+        player_rows=rows.groupby("Player", observed=True).indices,
+    )
+
+
+def build_similarity_index(team_stats_df: pd.DataFrame) -> SimilarityIndex:
+    """Standardize every player-season once and index it for nearest neighbour search."""
+    features = _features(team_stats_df)
+    mean = features.mean(axis=0)
+    scale = features.std(axis=0)
+    scale[scale == 0] = 1.0
+    embeddings = (features - mean) / scale
+
+    code_scale = np.abs(embeddings).max(axis=0) / 127
+    code_scale[code_scale == 0] = 1.0
+
+    rows = team_stats_df[ROW_COLUMNS].reset_index(drop=True)
+    return _make_index(rows, embeddings, mean, scale, code_scale)
+
+
+def extend_similarity_index(index: SimilarityIndex, new_stats_df: pd.DataFrame) -> SimilarityIndex:
+    """
+    Add player-seasons to an index without refitting it. New rows are standardized and quantized with the
+    index's own mean and scales, so the embeddings already stored keep their values.
+    build_similarity_index refits the standardization on every row.
+    """
+    embeddings = (_features(new_stats_df) - index.mean) / index.scale
+    rows = pd.concat([index.rows, new_stats_df[ROW_COLUMNS]], ignore_index=True)
+    return _make_index(rows, np.vstack([index.embeddings, embeddings]), index.mean, index.scale, index.code_scale)
+
+
+def embed_player(index: SimilarityIndex, player: str) -> np.ndarray:
+    """A player's embedding is the mean of their season embeddings."""
+    return index.embeddings[index.player_rows[player]].mean(axis=0)
+
+
+def _filter_mask(index: SimilarityIndex, seasons: tuple = None, positions: list = None) -> np.ndarray:
+    mask = np.ones(len(index.rows), dtype=bool)
+    if seasons:
+        season = index.rows["Season"].to_numpy()
+        mask &= (season >= seasons[0]) & (season <= seasons[1])
+    if positions:
+        mask &= index.rows["Pos"].isin(positions).to_numpy()
+    return mask
+
+
+def _exact_candidates(index: SimilarityIndex, queries: np.ndarray, candidates: np.ndarray, fetch: int) -> tuple:
+    # Squared euclidean distances of every query to every candidate in one matrix product
+    vectors = index.embeddings[candidates]
+    distances = (
+        (queries ** 2).sum(axis=1)[:, None]
+        + (vectors ** 2).sum(axis=1)[None, :]
+        - 2 * queries @ vectors.T
+    )
+    fetch = min(fetch, len(candidates))
+    nearest = np.argpartition(distances, fetch - 1, axis=1)[:, :fetch]
+    return candidates[nearest], np.take_along_axis(distances, nearest, axis=1)
+
+
+def _quantized_candidates(index: SimilarityIndex, queries: np.ndarray, candidates: np.ndarray, fetch: int) -> tuple:
+    # Rank by distance between int8 codes, then re-rank a shortlist with the exact embeddings
+    query_codes = np.round(queries / index.code_scale).clip(-127, 127).astype(np.int32)
+    codes = index.codes[candidates].astype(np.int32)
+    approx = (
+        (query_codes ** 2).sum(axis=1)[:, None]
+        + (codes ** 2).sum(axis=1)[None, :]
+        - 2 * query_codes @ codes.T
+    )
+    shortlist = min(fetch * 4, len(candidates))
+    nearest = np.argpartition(approx, shortlist - 1, axis=1)[:, :shortlist]
+
+    rows, distances = [], []
+    for query, shortlisted in zip(queries, candidates[nearest]):
+        found, dist = _exact_candidates(index, query[None, :], shortlisted, fetch)
+        rows.append(found[0])
+        distances.append(dist[0])
+    return np.array(rows), np.array(distances)
+
+
+def _tree_candidates(index: SimilarityIndex, queries: np.ndarray, fetch: int) -> tuple:
+    distances, rows = index.tree.query(queries, k=min(fetch, len(index.rows)))
+    return rows, distances ** 2
+
+
+def similar_players(index: SimilarityIndex, players, k: int = 10, seasons: tuple = None,
+                    positions: list = None, method: str = "tree") -> pd.DataFrame:
+    """
+    Find the k most similar other players for one player or a list of players.
+    Each similar player is reported once, with their closest season.
+    seasons is an inclusive (first, last) range and positions a list of position abbreviations.
+    """
+    if method not in SEARCH_METHODS:
+        raise ValueError(f"Unknown search method '{method}', expected one of {SEARCH_METHODS}")
+
+    players = [players] if isinstance(players, str) else list(players)
+    queries = np.vstack([embed_player(index, player) for player in players])
+    fetch = (k + 1) * OVERFETCH
+
+    # The tree covers every row, so filtered searches scan only the matching rows instead
+    filtered = bool(seasons or positions)
+    candidates = np.flatnonzero(_filter_mask(index, seasons, positions))
+    if not len(candidates):
+        return pd.DataFrame(columns=["Query", "Rank"] + ROW_COLUMNS + ["Distance"])
+
+    if method == "tree" and not filtered:
+        rows, distances = _tree_candidates(index, queries, fetch)
+    elif method == "quantized":
+        rows, distances = _quantized_candidates(index, queries, candidates, fetch)
+    else:
+        rows, distances = _exact_candidates(index, queries, candidates, fetch)
+
+    selected, distance_cols, query_cols, rank_cols = [], [], [], []
+    for player, query_rows, query_distances in zip(players, rows, distances):
+        order = np.argsort(query_distances, kind="stable")
+        query_rows, query_distances = query_rows[order], query_distances[order]
+
+        # Keep the closest season of every other player
+        codes = index.player_codes[query_rows]
+        _, first = np.unique(codes, return_index=True)
+        first = np.sort(first)
+        first = first[codes[first] != index.player_codes[index.player_rows[player][0]]][:k]
+
+        selected.append(query_rows[first])
+        distance_cols.append(np.sqrt(np.maximum(query_distances[first], 0)))
+        query_cols.append(np.repeat(player, len(first)))
+        rank_cols.append(np.arange(1, len(first) + 1))
+
+    results = index.rows.iloc[np.concatenate(selected)].reset_index(drop=True)
+    results.insert(0, "Query", np.concatenate(query_cols))
+    results.insert(1, "Rank", np.concatenate(rank_cols))
+    results["Distance"] = np.concatenate(distance_cols)
+    return results
+
+
+# --- Precomputed similar players table ---
+
+def player_embeddings(index: SimilarityIndex) -> tuple:
+    """Every player's name and embedding (the mean of their seasons), ordered by player code."""
+    embeddings = pd.DataFrame(index.embeddings).groupby(index.player_codes).mean().to_numpy()
+    names = index.rows["Player"].to_numpy()[np.unique(index.player_codes, return_index=True)[1]]
+    return names, embeddings
+
+
+def _player_distances(block: np.ndarray, rows: np.ndarray, row_norms: np.ndarray,
+                      player_starts: np.ndarray) -> np.ndarray:
+    distances = (block ** 2).sum(axis=1)[:, None] + row_norms[None, :] - 2 * block @ rows.T
+
+    # Rows are grouped by player, so each player's distance is the one of their closest season
+    return np.minimum.reduceat(distances, player_starts, axis=1)
+
+
+def _top_k_block(queries: np.ndarray, rows: np.ndarray, row_norms: np.ndarray, player_starts: np.ndarray,
+                 players: np.ndarray, k: int) -> tuple:
+    distances = _player_distances(queries[players], rows, row_norms, player_starts)
+    distances[np.arange(len(players)), players] = np.inf  # a player is not similar to themselves
+
+    nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    nearest_distances = np.take_along_axis(distances, nearest, axis=1)
+    order = np.argsort(nearest_distances, axis=1, kind="stable")
+    return np.take_along_axis(nearest, order, axis=1), np.take_along_axis(nearest_distances, order, axis=1)
+
+
+def build_similarity_table(index: SimilarityIndex, k: int = SIMILARITY_TABLE_K,
+                           memory_budget_mb: int = 64, workers: int = None) -> pd.DataFrame:
+    """
+    Compute the k most similar players for every player in one blocked pass, with the same ranking
+    as similar_players: distance from the player's mean embedding to each other player's closest season.
+    Blocks run on a thread pool (numpy releases the GIL for the matrix products), and the block size is
+    picked so the distance matrices of all workers together stay within memory_budget_mb.
+    """
+    names, queries = player_embeddings(index)
+    n = len(names)
+    k = min(k, n - 1)
+    rows, row_norms, row_players = _rows_by_player(index)
+    player_starts = _player_starts(row_players)
+
+    workers = workers or os.cpu_count() or 1
+    block_rows = _block_rows(memory_budget_mb, workers, len(rows))
+
+    def run_block(start: int) -> tuple:
+        return _top_k_block(queries, rows, row_norms, player_starts, np.arange(start, min(start + block_rows, n)), k)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        blocks = list(pool.map(run_block, range(0, n, block_rows)))
+
+    nearest = np.vstack([block[0] for block in blocks])
+    distances = np.vstack([block[1] for block in blocks])
+    return _table_frame(names, nearest, distances)
+
+
+def _rows_by_player(index: SimilarityIndex) -> tuple:
+    # Season embeddings grouped by player code, with the player code of each row
+    order = np.argsort(index.player_codes, kind="stable")
+    rows = index.embeddings[order]
+    return rows, (rows ** 2).sum(axis=1), index.player_codes[order]
+
+
+def _player_starts(row_players: np.ndarray) -> np.ndarray:
+    return np.flatnonzero(np.diff(row_players, prepend=-1))
+
+
+def _block_rows(memory_budget_mb: int, workers: int, row_count: int) -> int:
+    # Each block holds a float64 distance matrix over every row plus one temporary of the same size
+    return max(1, (memory_budget_mb * 2 ** 20) // (workers * row_count * 8 * 2))
+
+
+def _table_frame(names: np.ndarray, nearest: np.ndarray, distances: np.ndarray) -> pd.DataFrame:
+    # distances are squared
+    n, k = nearest.shape
+    players = pd.Categorical(names, categories=names)
+    return pd.DataFrame({
+        "Player": players[np.repeat(np.arange(n), k)],
+        "Rank": np.tile(np.arange(1, k + 1, dtype=np.int8), n),
+        "SimilarPlayer": players[nearest.ravel()],
+        "Distance": np.sqrt(np.maximum(distances.ravel(), 0)).astype(np.float32),
+    })
+
+
+def update_similarity_table(table: pd.DataFrame, index: SimilarityIndex, players,
+                            memory_budget_mb: int = 64) -> pd.DataFrame:
+    """
+    Refresh a similar players table after players gained seasons or were added to the index.
+    Their own rankings are recomputed in full, and everyone else's previous ranking is merged with
+    their new distances to those players. This matches build_similarity_table as long as no other
+    player's embedding moved, i.e. the index was extended rather than rebuilt.
+    """
+    names, queries = player_embeddings(index)
+    k = int(table["Rank"].iloc[-1])
+    rows, row_norms, row_players = _rows_by_player(index)
+
+    known = pd.Index(names).isin(table["Player"].cat.categories)
+    changed = np.flatnonzero(pd.Index(names).isin(players) | ~known)
+    nearest = np.empty((len(names), k), dtype=np.int64)
+    distances = np.empty((len(names), k))
+    nearest[changed], distances[changed] = _top_k_block(
+        queries, rows, row_norms, _player_starts(row_players), changed, k
+    )
+
+    # Previous rankings of everyone else, in the index's player codes, with the changed players left out
+    to_code = pd.Index(names).get_indexer(table["Player"].cat.categories)
+    previous_players = to_code[table["Player"].cat.codes.to_numpy()[::k]]
+    previous = to_code[table["SimilarPlayer"].cat.codes.to_numpy()].reshape(-1, k)
+    previous_distances = table["Distance"].to_numpy(dtype=float).reshape(-1, k) ** 2
+    previous_distances[np.isin(previous, changed)] = np.inf
+
+    unchanged = ~np.isin(previous_players, changed)
+    others, previous, previous_distances = previous_players[unchanged], previous[unchanged], previous_distances[unchanged]
+
+    # Their new candidates are the changed players, compared by the changed players' seasons only
+    changed_rows = np.isin(row_players, changed)
+    changed_starts = _player_starts(row_players[changed_rows])
+    block_rows = _block_rows(memory_budget_mb, 1, max(1, int(changed_rows.sum())))
+
+    for start in range(0, len(others), block_rows):
+        block = slice(start, start + block_rows)
+        new_distances = _player_distances(
+            queries[others[block]], rows[changed_rows], row_norms[changed_rows], changed_starts
+        )
+        candidates = np.hstack([previous[block], np.broadcast_to(changed, new_distances.shape)])
+        candidate_distances = np.hstack([previous_distances[block], new_distances])
+
+        order = np.argsort(candidate_distances, axis=1, kind="stable")[:, :k]
+        nearest[others[block]] = np.take_along_axis(candidates, order, axis=1)
+        distances[others[block]] = np.take_along_axis(candidate_distances, order, axis=1)
+
+    return _table_frame(names, nearest, distances)
+
+
+def build_similarity_table_file(force: bool = False) -> bool:
+    version = data_version("player_stats")
+    if not force and stored_version(SIMILARITY_TABLE_PATH) == version:
+        return False
+
+    table = build_similarity_table(build_similarity_index(read_dataset("player_stats")))
+    write_versioned_table(table, SIMILARITY_TABLE_PATH, version)
+    return True
+
+
+@st.cache_resource(show_spinner=False)
+def _load_similarity_table(version: str) -> pd.DataFrame:
+    return load_or_build(SIMILARITY_TABLE_PATH, version,
+                         lambda: build_similarity_table(build_similarity_index(read_dataset("player_stats"))))
+
+
+def load_similarity_table() -> pd.DataFrame:
+    """The precomputed similar players table, rebuilt when the player data changes."""
+    return _load_similarity_table(data_version("player_stats"))
+
+
+def lookup_similar_players(table: pd.DataFrame, players, k: int = SIMILARITY_TABLE_K) -> pd.DataFrame:
+    players = [players] if isinstance(players, str) else list(players)
+    categories = table["Player"].cat.categories
+    known = [categories.get_loc(player) for player in players if player in categories]
+
+    # Every player has one contiguous block of ranked rows, in player code order
+    table_k = int(table["Rank"].iloc[-1]) if len(table) else 0
+    starts = np.searchsorted(table["Player"].cat.codes.to_numpy(), known)
+    rows = (starts[:, None] + np.arange(min(k, table_k))[None, :]).ravel()
+    return table.iloc[rows].reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    # python similarity.py [--force] precomputes the similar players table
+    import sys
+
+    if build_similarity_table_file(force="--force" in sys.argv):
+        print(f"Wrote {SIMILARITY_TABLE_PATH}")
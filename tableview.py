@@ -0,0 +1,141 @@
+# --- Paginated table viewer related functions ---
+import math
+import re
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import streamlit as st
+from datastore import dataset_version, load_table
+from metrics import STAT_DECIMALS, exact_stats
+
+PAGE_SIZES = [25, 50, 100]
+
+# Numeric filters are a number, optionally prefixed with a comparison: "20", ">= 20", "< 0.5"
+NUMERIC_QUERY = re.compile(r"^\s*(==|=|!=|>=|<=|>|<)?\s*(-?\d+(?:\.\d*)?|-?\.\d+)\s*$")
+COMPARISONS = {
+    None: pc.equal, "=": pc.equal, "==": pc.equal, "!=": pc.not_equal,
+    ">": pc.greater, ">=": pc.greater_equal, "<": pc.less, "<=": pc.less_equal,
+}
+
+
+def filter_mask(values: pa.ChunkedArray, query: str) -> pa.ChunkedArray:
+    """
+    Rows matching the query: a comparison for numeric columns,
+    a case-insensitive substring match on the text of any other column.
+    """
+    if pa.types.is_integer(values.type) or pa.types.is_floating(values.type):
+        match = NUMERIC_QUERY.match(query)
+        if not match:
+            raise ValueError(f"'{query}' is not a number or a comparison like '>= 20'")
+        op, number = match.groups()
+        if values.type == pa.float32():
+            # Compared as the values the sources hold, like exact_stats shows them
+            values = pc.round(values.cast(pa.float64()), STAT_DECIMALS)
+        mask = COMPARISONS[op](values, float(number))
+    else:
+        mask = pc.match_substring(values.cast(pa.string()), query.strip(), ignore_case=True)
+    return pc.fill_null(mask, False)
+
+
+def row_order(table: pa.Table, sort_column: str = None, descending: bool = False,
+              filter_column: str = None, query: str = "") -> np.ndarray:
+    """Positions of the rows that pass the filter, in display order."""
+    rows = np.arange(table.num_rows)
+    if filter_column and query.strip():
+        rows = np.flatnonzero(filter_mask(table[filter_column], query).to_numpy())
+
+    if sort_column:
+        values = table[sort_column].take(rows)
+        if pa.types.is_dictionary(values.type):
+            # Categoricals sort by their labels
+            values = values.cast(values.type.value_type)
+        order = pc.sort_indices(values, sort_keys=[("", "descending" if descending else "ascending")])
+        rows = rows[order.to_numpy()]
+    return rows
+
+
+# Keyed by source, a hashable identity of the table's contents, since the table itself is not hashed
+@st.cache_resource(show_spinner=False, max_entries=64)
+def _row_order(source: tuple, _table: pa.Table, sort_column: str, descending: bool,
+               filter_column: str, query: str) -> np.ndarray:
+    return row_order(_table, sort_column, descending, filter_column, query)
+
+
+def matching_rows(table: pa.Table, source: tuple, sort_column: str = None, descending: bool = False,
+                  filter_column: str = None, query: str = "") -> np.ndarray:
+    """Display order of a table's rows after filtering and sorting, or None when it is the stored order."""
+    if not sort_column and not (filter_column and query.strip()):
+        return None
+    return _row_order(source, table, sort_column, descending, filter_column, query.strip())
+
+
+def read_page(table: pa.Table, page: int, page_size: int, rows: np.ndarray = None) -> pd.DataFrame:
+    """
+    One page of a table as a DataFrame indexed by row position, following the order of rows when given.
+    Only the page's rows are converted, so the cost of a page does not grow with the table.
+    """
+    start = page * page_size
+    if rows is None:
+        page_df = table.slice(start, page_size).to_pandas()
+        page_df.index = pd.RangeIndex(start, start + len(page_df))
+        return page_df
+
+    page_rows = rows[start:start + page_size]
+    page_df = table.take(page_rows).to_pandas()
+    page_df.index = page_rows
+    return page_df
+
+
+def _first_page(page_key: str):
+    st.session_state[page_key] = 1
+
+
+def table_viewer(table: pa.Table, key: str, source: tuple, page_size: int = PAGE_SIZES[0]):
+    """
+    Render a table one page at a time with server-side sorting and filtering.
+    source identifies the table's contents, e.g. its dataset name and data version, to cache row orders under.
+    """
+    page_key, size_key = f"{key}_page", f"{key}_page_size"
+
+    # Changing the order or the filter goes back to the first page
+    reset = {"on_change": _first_page, "args": (page_key,)}
+
+    sort_col, order_col, filter_col, query_col = st.columns([2, 1, 2, 3], vertical_alignment="bottom")
+    sort_column = sort_col.selectbox(
+        "Sort by", [None] + table.column_names, key=f"{key}_sort", **reset,
+        format_func=lambda column: "Original order" if column is None else column
+    )
+    descending = order_col.toggle("Descending", key=f"{key}_descending", **reset)
+    filter_column = filter_col.selectbox("Filter on", table.column_names, key=f"{key}_filter_column", **reset)
+    query = query_col.text_input("Filter", key=f"{key}_query", **reset,
+                                placeholder="Text, or a comparison like >= 20")
+
+    try:
+        rows = matching_rows(table, source, sort_column, descending, filter_column, query)
+    except ValueError as e:
+        st.warning(str(e))
+        rows = matching_rows(table, source, sort_column, descending)
+    total = table.num_rows if rows is None else len(rows)
+
+    # A larger page size can leave fewer pages than the one being shown
+    pages = max(1, math.ceil(total / st.session_state.get(size_key, page_size)))
+    if st.session_state.get(page_key, 1) > pages:
+        st.session_state[page_key] = pages
+
+    page_col, size_col, rows_col = st.columns([1, 1, 4], vertical_alignment="bottom")
+    page = page_col.number_input("Page", min_value=1, max_value=pages, key=page_key)
+    page_size = size_col.selectbox("Rows per page", PAGE_SIZES, key=size_key, index=PAGE_SIZES.index(page_size))
+
+    page_df = read_page(table, page - 1, page_size, rows)
+    start = (page - 1) * page_size
+    if total == 0:
+        rows_col.caption("No rows match")
+    else:
+        rows_col.caption(f"Rows {start + 1}-{start + len(page_df)} of {total}")
+    st.dataframe(exact_stats(page_df))
+
+
+def dataset_viewer(name: str, key: str, page_size: int = PAGE_SIZES[0]):
+    """table_viewer over a stored dataset, see datastore.DATASETS."""
+    table_viewer(load_table(name), key, (name, dataset_version(name)), page_size)